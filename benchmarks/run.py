@@ -0,0 +1,225 @@
+"""
+Timings for reformer transforms against hand-written dict baselines.
+
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --compare results.json --sizes 1000 10000
+
+Every case reports per-record latency, throughput at each batch size and
+tracemalloc peak memory of the largest batch, for the schema and for the
+equivalent hand-written function.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reformer import Reformer, Field  # noqa: E402
+
+SIZES = (1000, 10000, 100000, 1000000)
+DEPTHS = (1, 2, 4, 8)
+
+
+def record(i=1):
+    return {
+        'id': i,
+        'name': 'user %d' % i,
+        'status': i % 3,
+        'price': 10.5,
+        'address': {'city': 'Oslo', 'street': {'name': 'Main', 'number': i}},
+        'tags': ['a', 'b', 'c', 'd'],
+        'scores': {'x': 1, 'y': 2, 'z': 3},
+    }
+
+
+def case(name, target, *fields):
+
+    def decorator(baseline):
+        schema = type(name.title().replace('_', ''), (Reformer,), OrderedDict(fields))
+        CASES[name] = (schema, target, baseline)
+        return baseline
+    return decorator
+
+
+CASES = OrderedDict()
+STATUSES = {0: 'new', 1: 'active', 2: 'banned'}
+
+
+@case('path', record, ('id', Field('id')), ('city', Field('address.street.name')))
+def _(r):
+    return OrderedDict([('id', r['id']), ('city', r['address']['street']['name'])])
+
+
+@case('as', record, ('address', Field('address').as_({'city': Field('city'), 'street': Field('street.name')})))
+def _(r):
+    address = r['address']
+    return OrderedDict([('address', OrderedDict([('city', address['city']), ('street', address['street']['name'])]))])
+
+
+@case('iter', record, ('tags', Field('tags').iter([Field('self').upper()])))
+def _(r):
+    return OrderedDict([('tags', [tag.upper() for tag in r['tags']])])
+
+
+@case('iter_condition', record, ('tags', Field('tags').iter([Field('self')], condition=Field('self') > 'a')))
+def _(r):
+    return OrderedDict([('tags', [tag for tag in r['tags'] if tag > 'a'])])
+
+
+@case('iter_dict', record, ('scores', Field('scores').iter({Field('key'): Field('value')})))
+def _(r):
+    return OrderedDict([('scores', OrderedDict((key, value) for key, value in r['scores'].items()))])
+
+
+@case('map', record, ('status', Field('status').map(STATUSES)))
+def _(r):
+    return OrderedDict([('status', STATUSES.get(r['status']))])
+
+
+@case('call', record, ('name', Field('name').call(str.title)))
+def _(r):
+    return OrderedDict([('name', r['name'].title())])
+
+
+@case('arithmetic', record, ('total', Field('price') * 2 + 1), ('label', 'id: ' + Field('id', to=str)))
+def _(r):
+    return OrderedDict([('total', r['price'] * 2 + 1), ('label', 'id: ' + str(r['id']))])
+
+
+@case('compare', record, ('active', Field('status') == 1), ('big', Field('id') > 100))
+def _(r):
+    return OrderedDict([('active', r['status'] == 1), ('big', r['id'] > 100)])
+
+
+def nested(depth):
+    """Schema, target and baseline for records nested ``depth`` levels."""
+    schema = type('Leaf', (Reformer,), {'id': Field('id')})
+    for level in range(depth - 1):
+        fields = OrderedDict([('id', Field('id')), ('child', Field('child').as_(schema()))])
+        schema = type('Level%d' % level, (Reformer,), fields)
+
+    def target(i=1):
+        value = {'id': i}
+        for _ in range(depth - 1):
+            value = {'id': i, 'child': value}
+        return value
+
+    def baseline(r, depth=depth):
+        if depth == 1:
+            return OrderedDict([('id', r['id'])])
+        return OrderedDict([('id', r['id']), ('child', baseline(r['child'], depth - 1))])
+    return schema, target, baseline
+
+
+for _depth in DEPTHS:
+    CASES['nested_%d' % _depth] = nested(_depth)
+
+
+def clock(function, argument, minimum=0.2):
+    """Best time of one call, repeating until ``minimum`` seconds passed."""
+    best, total, calls = float('inf'), 0.0, 0
+    while total < minimum or calls < 3:
+        start = time.perf_counter()
+        function(argument)
+        elapsed = time.perf_counter() - start
+        best, total, calls = min(best, elapsed), total + elapsed, calls + 1
+    return best
+
+
+def peak(function, argument):
+    tracemalloc.start()
+    try:
+        function(argument)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(schema, target, baseline, sizes):
+    one = target()
+    records = [target(i) for i in range(max(sizes))]
+    implementations = OrderedDict([
+        ('reformer', (lambda r: schema.transform(r), lambda rs: schema.transform(rs, many=True))),
+        ('baseline', (baseline, lambda rs: list(map(baseline, rs)))),
+    ])
+    if schema.transform(one) != baseline(one):
+        raise AssertionError('%s baseline differs from the schema' % schema.__name__)
+    result = OrderedDict()
+    for name, (single, many) in implementations.items():
+        # per-record latency is the best of a batch of 1000 single calls
+        batch = records[:1000]
+        latency = clock(lambda rs: [single(r) for r in rs], batch) / len(batch)
+        throughput = OrderedDict(
+            (str(size), size / clock(many, records[:size], minimum=0 if size >= 100000 else 0.2)) for size in sizes)
+        result[name] = OrderedDict([
+            ('latency_us', latency * 1e6),
+            ('records_per_second', throughput),
+            ('peak_bytes', peak(many, records[:max(sizes)])),
+        ])
+    result['overhead'] = result['reformer']['latency_us'] / result['baseline']['latency_us']
+    return result
+
+
+def compare(results, previous, threshold):
+    """
+    Names of cases whose overhead over the baseline grew by more than
+    ``threshold``. The ratio keeps runs on different machines comparable.
+    """
+    slower = []
+    for name, result in results['cases'].items():
+        before = previous['cases'].get(name)
+        if before is None:
+            continue
+        ratio = result['overhead'] / before['overhead']
+        print('%-16s %6.2fx previous' % (name, ratio), file=sys.stderr)
+        if ratio > 1 + threshold:
+            slower.append(name)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--engine', choices=('compiled', 'closure'), default='compiled')
+    parser.add_argument('--output', help='write json results to this file instead of stdout')
+    parser.add_argument('--compare', help='json results of a previous run to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1, help='allowed overhead growth, 0.1 is 10%%')
+    args = parser.parse_args(argv)
+
+    Reformer._compile_ = args.engine == 'compiled'
+    results = OrderedDict([
+        ('python', platform.python_version()),
+        ('engine', args.engine),
+        ('sizes', args.sizes),
+        ('cases', OrderedDict()),
+    ])
+    for name in args.cases:
+        result = results['cases'][name] = measure(*CASES[name], sizes=args.sizes)
+        print('%-16s %8.2f us %8.2f us baseline %5.2fx' % (
+            name, result['reformer']['latency_us'], result['baseline']['latency_us'], result['overhead']),
+            file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as previous:
+            slower = compare(results, json.load(previous), args.threshold)
+        if slower:
+            print('slower than before: %s' % ', '.join(slower), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,103 +1,607 @@
+import contextlib
+import contextvars
+import csv
+import functools
+import gzip
+import hashlib
+import heapq
+import importlib.util
+import inspect
+import io
+import json
+import keyword
+import linecache
+import marshal
+import mmap
 import operator
-from collections import OrderedDict
+import os
+import pickle
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain, islice, repeat
+
+# imported by transform_columns and transform_async, most processes never pay for them
+numpy = None
+asyncio = None
 
 ATTR_NAME = '__fields__'
+COMPILED_ATTR = '__compiled__'
+PROJECTIONS_ATTR = '__projections__'
+PROJECTION_ATTR = '__projection__'
+DEPENDENCIES_ATTR = '__dependencies__'
+CHUNK_SIZE = 1000
+CHUNK_BYTES = 1 << 22
+CACHE_SIZE = 1024
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses uncached maxsize currsize')
+FieldStats = namedtuple('FieldStats', 'calls time errors')
+
+_pools = {}
+_pools_lock = threading.Lock()
+_compile_lock = threading.Lock()
+_reformer = contextvars.ContextVar('reformer')
+_instrument = contextvars.ContextVar('instrument', default=None)
+
+
+_PLAIN_TYPES = (dict, list, tuple, str)
+
+
+_missing = object()
+_unset = object()
+
+
+class MissingValueError(KeyError, AttributeError):
+    """A required field's path led to an absent key or attribute."""
+
+    __str__ = Exception.__str__
+
+
+def _self(obj):
+    return obj
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+def _lookup(name):
+    item = _item(name)
+
+    def lookup(obj):
+        value = getattr(obj, name, _missing)
+        if value is _missing:
+            return item(obj)
+        return value
+    return lookup
+
+
+def _item(key):
+
+    def item(obj):
+        try:
+            return obj[key]
+        except (KeyError, IndexError, TypeError):
+            return _missing
+    return item
+
+
+def _key(key):
+    return lambda obj: obj.get(key, _missing)
+
+
+def _attr(name):
+    return lambda obj: getattr(obj, name, _missing)
+
+
+def _absent(obj):
+    return _missing
+
+
+class _Accessor:
+    """
+    One step of a path: an attribute if the object has it, an item otherwise.
+    The lookup is specialized on the type of the last object seen and gives
+    ``_missing`` instead of raising when neither exists.
+    """
+    __slots__ = ('name', 'spec')
+
+    def __init__(self, name):
+        self.name = name
+        self.spec = (None, None)
+
+    def __call__(self, obj):
+        cls, get = self.spec
+        if type(obj) is cls:
+            return get(obj)
+        return self.resolve(obj)
+
+    def resolve(self, obj):
+        cls, name = type(obj), self.name
+        if not isinstance(name, str):
+            get = _item(name)
+        elif cls in _PLAIN_TYPES:
+            if hasattr(cls, name):
+                get = operator.attrgetter(name)
+            else:
+                get = _key(name) if cls is dict else _absent
+        elif hasattr(cls, '__getitem__'):
+            get = _lookup(name)
+        else:
+            get = _attr(name)
+        self.spec = (cls, get)
+        return get(obj)
+
+
+class _Memo:
+    """
+    LRU cache for a pure one-argument step. Unhashable values are passed
+    through to the function and counted as uncached.
+    """
+
+    def __init__(self, function, maxsize):
+        if _is_coroutine(function):
+            raise TypeError('cache is not supported for coroutine functions')
+        self.function = function
+        self.cached = functools.lru_cache(maxsize, typed=True)(function)
+        self.uncached = 0
+
+    def __call__(self, value):
+        try:
+            hash(value)
+        except TypeError:
+            self.uncached += 1
+            return self.function(value)
+        return self.cached(value)
+
+    def __reduce__(self):
+        return _Memo, (self.function, self.cached.cache_info().maxsize)
+
+    def cache_info(self):
+        info = self.cached.cache_info()
+        return CacheInfo(info.hits, info.misses, self.uncached, info.maxsize, info.currsize)
+
+
+def _memoize(function, cache):
+    if not cache:
+        return function
+    return _Memo(function, CACHE_SIZE if cache is True else cache)
+
+
+def _memos(value):
+    if isinstance(value, _Memo):
+        yield value
+    elif isinstance(value, _Target):
+        for op in value._ops:
+            for arg in op[1:]:
+                yield from _memos(arg)
+    elif isinstance(value, dict):
+        for key, val in value.items():
+            yield from _memos(key)
+            yield from _memos(val)
+    elif isinstance(value, (list, tuple)):
+        for val in value:
+            yield from _memos(val)
+
+
+def _parts(value):
+    """Targets and nested schemas in a value of a schema."""
+    if isinstance(value, (_Target, Reformer)):
+        yield value
+    if isinstance(value, _Target):
+        for op in value._ops:
+            for arg in op[1:]:
+                yield from _parts(arg)
+    elif isinstance(value, dict):
+        for key, val in value.items():
+            yield from _parts(key)
+            yield from _parts(val)
+    elif isinstance(value, (list, tuple)):
+        for val in value:
+            yield from _parts(val)
+
+
+class _Record:
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._astuple() == other._astuple()
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__))
+
+    def _astuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def _asdict(self):
+        return OrderedDict((name, getattr(self, name)) for name in self.__slots__)
+
+
+def _slots(name, keys):
+    namespace = {}
+    exec('def __init__(self, %s):\n%s' % (', '.join(keys), ''.join(
+        '    self.%s = %s\n' % (key, key) for key in keys) or '    pass\n'), namespace)
+    return type(name, (_Record,), {'__slots__': keys, '__init__': namespace['__init__']})
+
+
+def _values(*values):
+    return values
+
+
+def _identifiers(keys):
+    return len(set(keys)) == len(keys) and all(
+        isinstance(key, str) and key.isidentifier() and not keyword.iskeyword(key) and not key.startswith('_')
+        for key in keys)
+
+
+class _Output:
+    """
+    How a transform builds records, the containers with keys known by the
+    schema, and mappings, the containers with keys taken from the data.
+    """
+    _types = {}
+
+    def __init__(self, kind, inner=None):
+        self.kind = kind
+        self.mapping = OrderedDict if kind == 'ordered' else dict
+        self.fixed = kind in ('tuple', 'namedtuple', 'slots', 'row')
+        # the output of nested records; rows are flat values over dict records
+        self.inner = inner or self
+
+    def factory(self, name, keys):
+        keys = tuple(keys)
+        if self.kind in ('tuple', 'row'):
+            return _values
+        if self.fixed and _identifiers(keys):
+            key = (self.kind, name, keys)
+            if key not in self._types:
+                self._types[key] = namedtuple(name, keys) if self.kind == 'namedtuple' else _slots(name, keys)
+            return self._types[key]
+        mapping = self.mapping
+        return lambda *values: mapping(zip(keys, values))
+
+
+_OUTPUTS = {kind: _Output(kind) for kind in ('ordered', 'dict', 'tuple', 'namedtuple', 'slots')}
+_OUTPUTS['row'] = _Output('row', inner=_OUTPUTS['dict'])
+_OUTPUT_KINDS = {OrderedDict: 'ordered', dict: 'dict', tuple: 'tuple', 'namedtuple': 'namedtuple', 'slots': 'slots'}
+
+
+def _output(output):
+    if isinstance(output, _Output):
+        return output
+    try:
+        return _OUTPUTS[_OUTPUT_KINDS[output]]
+    except (KeyError, TypeError):
+        raise ValueError('Unknown output %r, expected one of dict, OrderedDict, tuple, '
+                         "'namedtuple' or 'slots'" % (output,))
+
+
+def _active_output():
+    reformer = _reformer.get(None)
+    return _OUTPUTS['ordered'] if reformer is None else reformer._output.inner
+
+
+def _static_keys(schema):
+    return not any(isinstance(key, _Target) for key in schema)
+
+
+def _inlinable(reformer):
+    """Whether the compiled engine can build records of a nested schema in place."""
+    cls = type(reformer)
+    return cls._compile_ and not reformer._lazy and not any(
+        _calls_method(getattr(cls, attr)) for attr in cls.__fields__)
+
+
+def _calls_method(value):
+    if isinstance(value, Reformer):
+        # a nested schema that can't be inlined is bound on its own
+        return False
+    if isinstance(value, _Target):
+        return any(op[0] == 'method' or any(_calls_method(arg) for arg in op[1:]) for op in value._ops)
+    if isinstance(value, dict):
+        return any(_calls_method(key) or _calls_method(val) for key, val in value.items())
+    if isinstance(value, (list, tuple)):
+        return any(_calls_method(val) for val in value)
+    return False
+
+
+_Entry = namedtuple('_Entry', 'key value')
+
+
+def _entry_safe(value):
+    """
+    Whether items of a dict walked by ``iter`` can be read as ``_Entry``
+    views: item fields start at ``key`` or ``value`` and read nothing else.
+    """
+    if isinstance(value, _Target):
+        if not value._item:
+            return True
+        return (isinstance(value, Field) and value._source is not None and bool(value._path.accessors) and
+                value._path.accessors[0].name in _Entry._fields and not any(
+                    _dynamic(arg) or isinstance(arg, (list, tuple)) and any(map(_dynamic, arg))
+                    for op in value._ops for arg in op[1:]))
+    if isinstance(value, dict):
+        return all(_entry_safe(key) and _entry_safe(val) for key, val in value.items())
+    if isinstance(value, (list, tuple)):
+        return all(map(_entry_safe, value))
+    return not isinstance(value, Reformer)
+
+
+def _iter_items(obj, entries):
+    """The object an iter evaluates on and the items of it."""
+    if isinstance(obj, dict):
+        if entries:
+            return obj, map(_Entry._make, obj.items())
+        obj = [{'key': k, 'value': v} for k, v in obj.items()]
+    return obj, obj
+
+
+def _windowed(limit, offset, order_by, reverse):
+    return limit is not None or bool(offset) or order_by is not None or reverse
+
+
+def _selector(check, key, limit, offset, reverse):
+    """
+    A function of the object and its items that yields the items an iter
+    keeps, evaluating only as many of them as the window needs.
+    """
+    stop = None if limit is None else offset + limit
+
+    def select(obj, items):
+        if check:
+            items = (item for item in items if check(obj, item))
+        if key is not None:
+            def sort_key(item):
+                return key(obj, item)
+            if stop is None:
+                items = sorted(items, key=sort_key, reverse=reverse)
+            else:
+                # a bounded heap keeps only the top items on the sort key
+                items = (heapq.nlargest if reverse else heapq.nsmallest)(stop, items, key=sort_key)
+        elif reverse:
+            items = reversed(items if isinstance(items, (list, tuple)) else list(items))
+        if offset or stop is not None:
+            items = islice(items, offset, stop)
+        return items
+    return select
+
+
+def _dynamic(value):
+    return isinstance(value, (_Target, dict, Reformer))
+
+
+def _members(container):
+    """A set for membership tests in a list or tuple of hashable values."""
+    if isinstance(container, (list, tuple)) and all(_hashable(value) for value in container):
+        return frozenset(container)
+    return container
+
+
+class _Path:
+    __slots__ = ('source', 'accessors')
+
+    def __init__(self, source=None):
+        self.parse(source)
+
+    def __getstate__(self):
+        return (self.source,)
+
+    def __setstate__(self, state):
+        self.parse(*state)
+
+    def parse(self, source):
+        self.source = source
+        if source is not None:
+            self.accessors = tuple(_Accessor(name) for name in source.split('.') if name != 'self')
+
+    def __call__(self, obj):
+        if self.source is None:
+            raise AttributeError('Field source is not set')
+        for accessor in self.accessors:
+            cls, get = accessor.spec
+            obj = get(obj) if type(obj) is cls else accessor.resolve(obj)
+        return obj
+
+
+class _Pipeline:
+    """
+    The getter of a target, the closures of its ops are chained on first
+    use so defining a schema only records them.
+    """
+
+    def __get__(self, target, cls=None):
+        if target is None:
+            return self
+        getter = target._initial_getter
+        for op in target._ops:
+            getter = getattr(target, '_op_' + op[0])(getter, *op[1:])
+        target.__dict__['_getter'] = getter
+        return getter
 
 
 class _Target:
+    _getter = _Pipeline()
 
-    def __init__(self, getter=lambda obj: obj):
+    def __init__(self, getter=_self):
         self._initial_getter = getter
-        self._getter = self._initial_getter
-        self.__item = False
-        self.__null = False
-        self.__default = None
+        self._ops = []
+        self._item = False
+        self._null = False
+        self._default = None
+
+    def _push(self, name, *args):
+        self._ops.append((name,) + args)
+        self.__dict__.pop('_getter', None)
+        return self
 
-    def __get_value(self, value, obj, item=None):
+    def __getstate__(self):
+        # the getter is a chain of closures, it is pickled as the ops that build it
+        state = dict(self.__dict__)
+        state.pop('_getter', None)
+        return state
+
+    @staticmethod
+    def _evaluator(value):
+        """
+        A function of the object and the current item that evaluates a value
+        of a schema. The kind of the value is dispatched on once, here.
+        """
         if isinstance(value, _Target):
-            if item is not None and value.__item:
-                return value._get(item)
-            else:
+
+            def evaluate(obj, item=None):
+                if item is not None and value._item:
+                    return value._get(item)
                 return value._get(obj)
-        if isinstance(value, dict):
-            res = OrderedDict()
-            for key, value in value.items():
-                res[self.__get_value(key, obj, item)] = self.__get_value(value, obj, item)
-            return res
-        if isinstance(value, Reformer):
-            value.content['parent'] = obj
-            return value._transform(item or obj)
-        return value
+        elif isinstance(value, dict) and not any(_dynamic(key) or _dynamic(val) for key, val in value.items()):
+            items = tuple(value.items())
+
+            def evaluate(obj, item=None):
+                return _active_output().mapping(items)
+        elif isinstance(value, dict):
+            pairs = [(_Target._evaluator(key), _Target._evaluator(val)) for key, val in value.items()]
+
+            def evaluate(obj, item=None):
+                res = _active_output().mapping()
+                for key, val in pairs:
+                    res[key(obj, item)] = val(obj, item)
+                return res
+        elif isinstance(value, Reformer):
+
+            def evaluate(obj, item=None):
+                return value._bind(obj, _reformer.get(None))._transform(item or obj)
+        else:
+
+            def evaluate(obj, item=None):
+                return value
+        return evaluate
 
     def as_(self, schema):
-        getter = self._getter
+        return self._push('as', schema)
+
+    in_form = as_
+
+    def _op_as(self, getter, schema):
+        if isinstance(schema, dict) and _static_keys(schema):
+            keys, values = tuple(schema), [self._evaluator(value) for value in schema.values()]
+
+            def build(obj, item):
+                return _active_output().factory('Record', keys)(*[value(obj, item) for value in values])
+        elif isinstance(schema, (list, tuple)):
+            values, cls = [self._evaluator(value) for value in schema], type(schema)
+
+            def build(obj, item):
+                res = [value(obj, item) for value in values]
+                return res if cls is list else cls(res)
+        else:
+            build = self._evaluator(schema)
 
         def _getter(obj):
             item = getter(obj)
-            if isinstance(schema, dict):
-                res = OrderedDict()
-                for key, value in schema.items():
-                    res[self.__get_value(key, obj, item)] = self.__get_value(value, obj, item)
+            if item is _missing:
+                return item
+            return build(obj, item)
+        return _getter
+
+    def iter(self, schema, condition=None, limit=None, offset=0, order_by=None, reverse=False):
+        return self._push('iter', schema, condition, limit, offset, order_by, reverse)
+
+    def _op_iter(self, getter, schema, condition, limit=None, offset=0, order_by=None, reverse=False):
+        check = condition and self._evaluator(condition)
+        select = None
+        if _windowed(limit, offset, order_by, reverse):
+            key = None if order_by is None else self._evaluator(order_by)
+            select, check = _selector(check, key, limit, offset, reverse), None
+        if isinstance(schema, dict):
+            _key, _value = [self._evaluator(value) for value in next(iter(schema.items()))]
+
+            def build(obj, items):
+                res = _active_output().mapping()
+                for item in items:
+                    if check and not check(obj, item):
+                        continue
+                    res[_key(obj, item)] = _value(obj, item)
                 return res
-            if isinstance(schema, (list, tuple)):
-                res = []
-                for value in schema:
-                    res.append(self.__get_value(value, obj, item))
-                return type(schema)(res)
-            return self.__get_value(schema, obj, item)
-        self._getter = _getter
-        return self
+        elif isinstance(schema, (tuple, list)):
+            _value, cls = self._evaluator(schema[0]), type(schema)
 
-    in_form = as_
+            def build(obj, items):
+                res = [_value(obj, item) for item in items if not check or check(obj, item)]
+                return res if cls is list else cls(res)
+        else:
 
-    def iter(self, schema, condition=None):
-        getter = self._getter
+            def build(obj, items):
+                return None
+        entries = _entry_safe([schema, condition, order_by])
 
         def _getter(obj):
             obj = getter(obj)
-            if isinstance(obj, dict):
-                obj = [{'key': k, 'value': v} for k, v in obj.items()]
-
-            if isinstance(schema, dict):
-                res = OrderedDict()
-                _key, _value = list(schema.items())[0]
-                for item in obj:
-                    if condition and not self.__get_value(condition, obj, item):
-                        continue
-                    res[self.__get_value(_key, obj, item)] = self.__get_value(_value, obj, item)
-                return res
-            if isinstance(schema, (tuple, list)):
-                res = []
-                _value = schema[0]
+            if obj is _missing:
+                return obj
+            obj, items = _iter_items(obj, entries)
+            return build(obj, select(obj, items) if select else items)
+        return _getter
 
-                for item in obj:
-                    if condition and not self.__get_value(condition, obj, item):
-                        continue
-                    res.append(self.__get_value(_value, obj, item))
-                return type(schema)(res)
+    def compare(self, item, operator=operator.eq):
+        return self._push('compare', item, operator)
 
-        self._getter = _getter
-        return self
+    def _op_compare(self, getter, item, operator):
+        other = self._evaluator(item)
 
-    def compare(self, item, operator=operator.eq):
-        getter = self._getter
-        self._getter = lambda obj: operator(getter(obj), self.__get_value(item, obj))
-        return self
+        def _getter(obj):
+            value = getter(obj)
+            if value is _missing:
+                return value
+            return operator(value, other(obj))
+        return _getter
 
     def at(self, container):
-        getter = self._getter
-        self._getter = lambda obj: (getter(obj) in container)
-        return self
+        return self._push('at', container)
+
+    def _op_at(self, getter, container):
+        members = _members(container)
+
+        def _getter(obj):
+            value = getter(obj)
+            if value is _missing:
+                return value
+            try:
+                return value in members
+            except TypeError:
+                return value in container
+        return _getter
 
     def contains(self, item):
-        getter = self._getter
-        self._getter = lambda obj: (item in getter(obj))
-        return self
+        return self._push('contains', item)
 
-    def to(self, type):
-        getter = self._getter
-        self._getter = lambda obj: type(getter(obj))
-        return self
+    def _op_contains(self, getter, item):
+
+        def _getter(obj):
+            value = getter(obj)
+            return value if value is _missing else item in value
+        return _getter
+
+    def to(self, type, cache=None):
+        return self._push('to', _memoize(type, cache))
+
+    def _op_to(self, getter, type):
+
+        def _getter(obj):
+            value = getter(obj)
+            return value if value is _missing else type(value)
+        return _getter
 
     def to_str(self):
         return self.to(str)
@@ -106,103 +610,122 @@ class _Target:
         return self.to(int)
 
     def map(self, choices, default=None):
-        getter = self._getter
+        return self._push('map', choices, default)
 
-        def _getter(obj):
-            obj = getter(obj)
-            if isinstance(choices, (list, tuple)):
-                assert isinstance(obj, int)
-                if len(choices) > obj:
-                    return choices[obj]
-                return default
-            if isinstance(choices, dict):
-                return choices.get(obj, default)
-            return getattr(choices, obj, default)
-        self._getter = _getter
-        return self
+    def _op_map(self, getter, choices, default):
+        if isinstance(choices, (list, tuple)):
+            choices = tuple(choices)
+            size = len(choices)
+
+            def lookup(value):
+                assert isinstance(value, int)
+                return choices[value] if size > value else default
+        elif isinstance(choices, dict):
+
+            def lookup(value):
+                return choices.get(value, default)
+        else:
 
-    def call(self, function):
-        getter = self._getter
+            def lookup(value):
+                return getattr(choices, value, default)
 
         def _getter(obj):
             obj = getter(obj)
-            return function(obj)
+            return obj if obj is _missing else lookup(obj)
+        return _getter
 
-        self._getter = _getter
-        return self
+    def call(self, function, cache=None):
+        return self._push('call', _memoize(function, cache))
 
     handle = call
 
+    def _op_call(self, getter, function):
+
+        def _getter(obj):
+            obj = getter(obj)
+            return obj if obj is _missing else function(obj)
+        return _getter
+
     def set_null(self):
-        self.__null = True
+        self._null = True
         return self
 
     def set_default(self, value):
-        self.__default = value
+        self._default = value
         return self
 
     def set_as_item(self, value=True):
-        self.__item = value
+        self._item = value
         return self
 
     def __getattr__(self, item):
-        getter = self._getter
+        if item.startswith('__') and item.endswith('__'):
+            # protocols like pickle and copy look up optional special methods
+            raise AttributeError(item)
+        return self._push('getattr', item)
 
-        def _getter(obj):
-            obj = getter(obj)
-            if isinstance(item, str) and hasattr(obj, item):
-                return getattr(obj, item)
-            return obj[item]
-        self._getter = _getter
-        return self
+    def __getitem__(self, item):
+        return self._push('getattr', item)
 
-    __getitem__ = __getattr__
+    def _op_getattr(self, getter, item):
+        accessor = _Accessor(item) if isinstance(item, str) else _item(item)
+        return lambda obj: accessor(getter(obj))
 
     def __call__(self, *args, **kwargs):
-        getter = self._getter
+        return self._push('invoke', args, kwargs)
+
+    def _op_invoke(self, getter, args, kwargs):
 
         def _getter(obj):
+            function = getter(obj)
+            if function is _missing:
+                return function
             _args = [a._get(obj) if isinstance(a, _Target) else a for a in args]
             _kw = {k._get(obj) if isinstance(k, _Target) else k: v._get(obj) if isinstance(v, _Target) else v
                    for k, v in kwargs.items()}
-            return getter(obj)(*_args, **_kw)
-        self._getter = _getter
-        return self
+            return function(*_args, **_kw)
+        return _getter
 
     def __iter__(self):
         raise NotImplementedError
 
     def __add__(self, other):
-        getter = self._getter
-        if isinstance(other, _Target):
-            self._getter = lambda obj: (getter(obj) + other._getter(obj))
-        else:
-            self._getter = lambda obj: (getter(obj) + other)
-        return self
+        return self._push('add', other)
+
+    def _op_add(self, getter, other):
+        return self._binary(getter, other, operator.add)
 
     def __radd__(self, other):
-        getter = self._getter
-        if isinstance(other, _Target):
-            self._getter = lambda obj: (other._getter(obj) + getter(obj))
-        else:
-            self._getter = lambda obj: (other + getter(obj))
-        return self
+        return self._push('radd', other)
+
+    def _op_radd(self, getter, other):
+        return self._binary(getter, other, operator.add, reverse=True)
 
     def __mul__(self, other):
-        getter = self._getter
-        if isinstance(other, _Target):
-            self._getter = lambda obj: (getter(obj) * other._getter(obj))
-        else:
-            self._getter = lambda obj: (getter(obj) * other)
-        return self
+        return self._push('mul', other)
+
+    def _op_mul(self, getter, other):
+        return self._binary(getter, other, operator.mul)
 
     def __rmul__(self, other):
-        getter = self._getter
-        if isinstance(other, _Target):
-            self._getter = lambda obj: (other._getter(obj) * getter(obj))
-        else:
-            self._getter = lambda obj: (other * getter(obj))
-        return self
+        return self._push('rmul', other)
+
+    def _op_rmul(self, getter, other):
+        return self._binary(getter, other, operator.mul, reverse=True)
+
+    @staticmethod
+    def _binary(getter, other, operator, reverse=False):
+        operand = other._getter if isinstance(other, _Target) else lambda obj: other
+
+        def _getter(obj):
+            value = getter(obj)
+            if value is _missing:
+                return value
+            other = operand(obj)
+            if other is _missing:
+                return other
+            return operator(other, value) if reverse else operator(value, other)
+        return _getter
 
     def __eq__(self, other):
         return self.compare(other)
@@ -220,15 +743,23 @@ class _Target:
         return self.compare(other, operator.le)
 
     def __hash__(self):
-        return hash(self._getter)
+        return id(self) >> 4
 
     def _get(self, obj):
-        try:
-            return self._getter(obj)
-        except (KeyError, AttributeError, TypeError):
-            if self.__null or self.__default is not None:
-                return self.__default
-            raise
+        value = self._getter(obj)
+        if value is _missing:
+            return self._absent()
+        return value
+
+    def _absent(self):
+        if self._null or self._default is not None:
+            return self._default
+        # __dict__ is read directly, attributes a target lacks would become ops
+        path, name = self.__dict__.get('_path'), self.__dict__.get('_name')
+        source = 'value' if path is None or path.source is None else repr(path.source)
+        if name is None:
+            raise MissingValueError('%s is missing' % source)
+        raise MissingValueError('%s is missing for field %r' % (source, name))
 
 
 class _ReformerMeta(type):
@@ -259,41 +790,1215 @@ class _ReformerMeta(type):
         return type.__new__(mcs, name, bases, attrs)
 
 
+_LITERALS = (str, int, bool, type(None))
+
+_OPERATORS = {
+    operator.eq: '==',
+    operator.ne: '!=',
+    operator.gt: '>',
+    operator.ge: '>=',
+    operator.lt: '<',
+    operator.le: '<=',
+}
+
+
+def _code(source, filename, directory):
+    """
+    The code object of generated source. With a ``directory`` it is kept
+    there, keyed by a hash of the source, for later processes to load.
+    """
+    if directory is None:
+        return compile(source, filename, 'exec')
+    key = hashlib.sha1(importlib.util.MAGIC_NUMBER + filename.encode() + source.encode()).hexdigest()
+    path = os.path.join(directory, key + '.code')
+    try:
+        with open(path, 'rb') as file:
+            return marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    code = compile(source, filename, 'exec')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # written aside and renamed so concurrent processes never read a partial file
+        temporary = '%s.%d' % (path, os.getpid())
+        with open(temporary, 'wb') as file:
+            marshal.dump(code, file)
+        os.replace(temporary, path)
+    except OSError:
+        pass
+    return code
+
+
+class _Compiler:
+    """
+    Flattens the op chains of a schema into the source of one function,
+    so a record costs a single call instead of a stack of closures.
+    """
+
+    def __init__(self, schema, output, shared=()):
+        self.schema = schema
+        self.output = output
+        self.lines = []
+        self.consts = {}
+        self.names = {}
+        self.count = 0
+        self.shared = shared
+        self.uses = {}
+        self.prefixes = {}
+
+    def const(self, value):
+        if type(value) in _LITERALS:
+            return repr(value)
+        name = self.names.get(id(value))
+        if name is None:
+            name = self.names[id(value)] = '_c%d' % len(self.names)
+            self.consts[name] = value
+        return name
+
+    def var(self):
+        self.count += 1
+        return '_v%d' % self.count
+
+    def emit(self, indent, line, *args):
+        self.lines.append('    ' * indent + (line % args if args else line))
+
+    def compile(self):
+        # a first pass counts how many chains read each path of the record,
+        # the paths read more than once are evaluated once per record
+        probe = _Compiler(self.schema, self.output)
+        probe.source()
+        self.shared = {path for path, count in probe.uses.items() if count > 1}
+        source = self.source()
+        filename = '<reformer %s.%s>' % (self.schema.__module__, self.schema.__qualname__)
+        namespace = dict(self.consts, OrderedDict=OrderedDict, _missing=_missing, _unset=_unset)
+        exec(_code(source, filename, self.schema._cache_dir_), namespace)
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        return namespace['transform']
+
+    def source(self):
+        fields = getattr(self.schema, ATTR_NAME)
+        self.emit(0, 'def transform(self, target):')
+        self.emit(1, 'blank = self._blank')
+        if self.output.fixed:
+            self.emit(1, 'fill = blank if blank and blank is not True else None')
+        else:
+            self.emit(1, 'fill = None if blank is True else blank')
+            self.emit(1, 'result = %s', self.mapping())
+        start = len(self.lines)
+        values = []
+        for attr in fields:
+            field = _class_attr(self.schema, attr)
+            value = self.get(field, 'target', 1)
+            if self.output.fixed:
+                values.append(self.var())
+                self.emit(1, '%s = fill if %s is None else %s', values[-1], value, value)
+                continue
+            self.emit(1, 'if %s is None:', value)
+            self.emit(2, 'if blank:')
+            self.emit(3, 'result[%r] = fill', attr)
+            self.emit(1, 'else:')
+            self.emit(2, 'result[%r] = %s', attr, value)
+        if self.output.fixed:
+            self.emit(1, 'return %s', self.record(self.schema.__name__, fields, values))
+        else:
+            self.emit(1, 'return result')
+        if self.prefixes:
+            self.lines.insert(start, '    %s = _unset' % ' = '.join(self.prefixes.values()))
+        return '\n'.join(self.lines) + '\n'
+
+    def mapping(self):
+        return 'OrderedDict()' if self.output.inner.mapping is OrderedDict else '{}'
+
+    def record(self, name, keys, values):
+        if self.output.kind in ('tuple', 'row'):
+            return '(%s)' % ''.join(value + ', ' for value in values)
+        return '%s(%s)' % (self.const(self.output.factory(name, keys)), ', '.join(values))
+
+    def value(self, value, obj, item, indent):
+        if isinstance(value, _Target):
+            if isinstance(item, _Entry) and value._item:
+                return self.get(value, item, indent)
+            if item is not None and value._item:
+                source = self.var()
+                self.emit(indent, '%s = %s if %s is not None else %s', source, item, item, obj)
+                return self.get(value, source, indent)
+            return self.get(value, obj, indent)
+        if isinstance(value, dict):
+            res = self.var()
+            self.emit(indent, '%s = %s', res, self.mapping())
+            for key, val in value.items():
+                key = self.value(key, obj, item, indent)
+                val = self.value(val, obj, item, indent)
+                self.emit(indent, '%s[%s] = %s', res, key, val)
+            return res
+        if isinstance(value, Reformer):
+            if _inlinable(value):
+                if item is None:
+                    return self.inline(value, obj, indent)
+                source = self.var()
+                self.emit(indent, '%s = %s or %s', source, item, obj)
+                return self.inline(value, source, indent)
+            res = self.var()
+            reformer = self.const(value)
+            if item is None:
+                self.emit(indent, '%s = %s._bind(%s, self)._transform(%s)', res, reformer, obj, obj)
+            else:
+                self.emit(indent, '%s = %s._bind(%s, self)._transform(%s or %s)',
+                          res, reformer, obj, item, obj)
+            return res
+        return self.const(value)
+
+    def inline(self, reformer, source, indent):
+        # nested records are built in place, with the parent's output for them
+        output, self.output = self.output, self.output.inner
+        try:
+            if not reformer._many:
+                return self.inline_record(reformer, source, indent)
+            res, item = self.var(), self.var()
+            self.emit(indent, '%s = []', res)
+            self.emit(indent, 'for %s in %s:', item, source)
+            self.emit(indent + 1, '%s.append(%s)', res, self.inline_record(reformer, item, indent + 1))
+            return res
+        finally:
+            self.output = output
+
+    def inline_record(self, reformer, target, indent):
+        cls, blank = type(reformer), reformer._blank
+        fill = self.const(blank if blank and blank is not True else None)
+        fields = getattr(cls, ATTR_NAME)
+        values = [self.get(_class_attr(cls, attr), target, indent) for attr in fields]
+        if self.output.fixed:
+            if fill != 'None':
+                values = ['(%s if %s is None else %s)' % (fill, value, value) for value in values]
+            return self.record(cls.__name__, fields, values)
+        res = self.var()
+        self.emit(indent, '%s = %s', res, self.mapping())
+        for attr, value in zip(fields, values):
+            if blank is True:
+                self.emit(indent, '%s[%r] = %s', res, attr, value)
+            elif fill != 'None':
+                self.emit(indent, '%s[%r] = %s if %s is None else %s', res, attr, fill, value, value)
+            else:
+                self.emit(indent, 'if %s is not None:', value)
+                self.emit(indent + 1, '%s[%r] = %s', res, attr, value)
+        return res
+
+    def get(self, target, obj, indent):
+        value, res = self.chain(target, obj, indent), self.var()
+        if target._null or target._default is not None:
+            self.emit(indent, '%s = %s if %s is _missing else %s', res, self.const(target._default), value, value)
+        else:
+            self.emit(indent, '%s = %s._absent() if %s is _missing else %s', res, self.const(target), value, value)
+        return res
+
+    def chain(self, target, obj, indent):
+        res = obj
+        path = () if obj == 'target' else None
+        # lookups give _missing instead of raising, the other ops are skipped for it
+        missing = False
+        if isinstance(obj, _Entry):
+            # entry safe fields start at the key or the value of a dict item
+            accessors = target._path.accessors
+            res, missing = getattr(obj, accessors[0].name), False
+            for accessor in accessors[1:]:
+                res, path = self.step(path, accessor.name, res, indent, accessor)
+                missing = True
+        elif isinstance(target, Field) and target._source is not None:
+            for accessor in target._path.accessors:
+                res, path = self.step(path, accessor.name, res, indent, accessor)
+                missing = True
+        elif target._initial_getter is not _self:
+            res, path, missing = self.var(), None, True
+            self.emit(indent, '%s = %s(%s)', res, self.const(target._initial_getter), obj)
+        for op in target._ops:
+            if path is not None and op[0] == 'getattr' and _hashable(op[1]):
+                res, path = self.step(path, op[1], res, indent)
+            elif op[0] == 'getattr' or not missing:
+                res, path = getattr(self, '_op_' + op[0])(target, res, obj, indent, *op[1:]), None
+            else:
+                value, res, path = res, self.var(), None
+                self.emit(indent, '%s = _missing', res)
+                self.emit(indent, 'if %s is not _missing:', value)
+                self.emit(indent + 1, '%s = %s', res, getattr(self, '_op_' + op[0])(
+                    target, value, obj, indent + 1, *op[1:]))
+            # once a lookup could have missed every later op is guarded, binary
+            # ops give _missing for a missing operand as well
+            missing = missing or op[0] == 'getattr' or op[0] in ('add', 'radd', 'mul', 'rmul') and isinstance(
+                op[1], _Target)
+        return res
+
+    def step(self, path, item, value, indent, accessor=None):
+        if path is None:
+            return self.lookup(item, value, indent, accessor), None
+        path += (item,)
+        self.uses[path] = self.uses.get(path, 0) + 1
+        if path not in self.shared:
+            return self.lookup(item, value, indent, accessor), path
+        name = self.prefixes.get(path)
+        if name is None:
+            name = self.prefixes[path] = '_p%d' % len(self.prefixes)
+        self.emit(indent, 'if %s is _unset:', name)
+        self.emit(indent + 1, '%s = %s', name, self.lookup(item, value, indent + 1, accessor))
+        return name, path
+
+    def lookup(self, item, value, indent, accessor=None):
+        if accessor is None:
+            return self._op_getattr(None, value, None, indent, item)
+        return self.access(accessor, value, indent)
+
+    def operand(self, value, obj, indent):
+        if isinstance(value, _Target):
+            return self.chain(value, obj, indent)
+        return self.const(value)
+
+    def _op_as(self, target, value, obj, indent, schema):
+        res = self.var()
+        if isinstance(schema, dict) and self.output.inner.fixed and _static_keys(schema):
+            values = [self.value(val, obj, value, indent) for val in schema.values()]
+            self.emit(indent, '%s = %s', res, self.record('Record', schema, values))
+        elif isinstance(schema, dict):
+            self.emit(indent, '%s = %s', res, self.mapping())
+            for key, val in schema.items():
+                key = self.value(key, obj, value, indent)
+                val = self.value(val, obj, value, indent)
+                self.emit(indent, '%s[%s] = %s', res, key, val)
+        elif isinstance(schema, (list, tuple)):
+            values = [self.value(val, obj, value, indent) for val in schema]
+            items = ''.join(val + ', ' for val in values)
+            if type(schema) is list:
+                self.emit(indent, '%s = [%s]', res, items)
+            elif type(schema) is tuple:
+                self.emit(indent, '%s = (%s)', res, items)
+            else:
+                self.emit(indent, '%s = %s([%s])', res, self.const(type(schema)), items)
+        else:
+            self.emit(indent, '%s = %s', res, self.value(schema, obj, value, indent))
+        return res
+
+    def _op_iter(self, target, value, obj, indent, schema, condition, limit=None, offset=0, order_by=None,
+                 reverse=False):
+        res = self.var()
+        if not (isinstance(schema, (dict, list, tuple)) and schema):
+            getter = target._op_iter(_self, schema, condition, limit, offset, order_by, reverse)
+            self.emit(indent, '%s = %s(%s)', res, self.const(getter), value)
+            return res
+        if _windowed(limit, offset, order_by, reverse):
+            # the window is selected by the closure engine, kept items run compiled
+            key = None if order_by is None else target._evaluator(order_by)
+            select = _selector(condition and target._evaluator(condition), key, limit, offset, reverse)
+            source, items = self.var(), self.var()
+            self.emit(indent, '%s, %s = %s(%s, %r)', source, items, self.const(_iter_items), value,
+                      _entry_safe([schema, condition, order_by]))
+            self.emit(indent, '%s = %s(%s, %s)', items, self.const(select), source, items)
+            self.loop(res, source, items, self.var(), indent, schema, None)
+            return res
+        if not _entry_safe([schema, condition]):
+            items = self.var()
+            self.emit(indent, "%s = [{'key': k, 'value': v} for k, v in %s.items()] if isinstance(%s, dict) else %s",
+                      items, value, value, value)
+            self.loop(res, items, items, self.var(), indent, schema, condition)
+            return res
+        # the key and the value of dict items stay in locals
+        entry = _Entry(self.var(), self.var())
+        self.emit(indent, 'if isinstance(%s, dict):', value)
+        self.loop(res, value, '%s.items()' % value, entry, indent + 1, schema, condition)
+        self.emit(indent, 'else:')
+        self.loop(res, value, value, self.var(), indent + 1, schema, condition)
+        return res
+
+    def loop(self, res, obj, items, item, indent, schema, condition):
+        if isinstance(schema, dict):
+            _key, _value = list(schema.items())[0]
+            self.emit(indent, '%s = %s', res, self.mapping())
+        else:
+            _key, _value = None, schema[0]
+            self.emit(indent, '%s = []', res)
+        self.emit(indent, 'for %s in %s:', ', '.join(item) if isinstance(item, _Entry) else item, items)
+        if condition:
+            check = self.value(condition, obj, item, indent + 1)
+            self.emit(indent + 1, 'if not %s:', check)
+            self.emit(indent + 2, 'continue')
+        if _key is not None:
+            _key = self.value(_key, obj, item, indent + 1)
+            _value = self.value(_value, obj, item, indent + 1)
+            self.emit(indent + 1, '%s[%s] = %s', res, _key, _value)
+        else:
+            self.emit(indent + 1, '%s.append(%s)', res, self.value(_value, obj, item, indent + 1))
+            if type(schema) is not list:
+                self.emit(indent, '%s = %s(%s)', res, self.const(type(schema)), res)
+
+    def _op_compare(self, target, value, obj, indent, item, operator):
+        res = self.var()
+        other = self.value(item, obj, None, indent)
+        if operator in _OPERATORS:
+            self.emit(indent, '%s = %s %s %s', res, value, _OPERATORS[operator], other)
+        else:
+            self.emit(indent, '%s = %s(%s, %s)', res, self.const(operator), value, other)
+        return res
+
+    def _op_at(self, target, value, obj, indent, container):
+        res, members = self.var(), _members(container)
+        if members is container:
+            self.emit(indent, '%s = %s in %s', res, value, self.const(container))
+            return res
+        self.emit(indent, 'try:')
+        self.emit(indent + 1, '%s = %s in %s', res, value, self.const(members))
+        self.emit(indent, 'except TypeError:')
+        self.emit(indent + 1, '%s = %s in %s', res, value, self.const(container))
+        return res
+
+    def _op_contains(self, target, value, obj, indent, item):
+        res = self.var()
+        self.emit(indent, '%s = %s in %s', res, self.const(item), value)
+        return res
+
+    def _op_to(self, target, value, obj, indent, type):
+        res = self.var()
+        self.emit(indent, '%s = %s(%s)', res, self.const(type), value)
+        return res
+
+    def _op_map(self, target, value, obj, indent, choices, default):
+        res = self.var()
+        _choices, _default = self.const(choices), self.const(default)
+        if isinstance(choices, (list, tuple)):
+            self.emit(indent, 'assert isinstance(%s, int)', value)
+            self.emit(indent, '%s = %s[%s] if len(%s) > %s else %s',
+                      res, _choices, value, _choices, value, _default)
+        elif isinstance(choices, dict):
+            self.emit(indent, '%s = %s.get(%s, %s)', res, _choices, value, _default)
+        else:
+            self.emit(indent, '%s = getattr(%s, %s, %s)', res, _choices, value, _default)
+        return res
+
+    def _op_call(self, target, value, obj, indent, function):
+        res = self.var()
+        self.emit(indent, '%s = %s(%s)', res, self.const(function), value)
+        return res
+
+    def _op_method(self, target, value, obj, indent):
+        res = self.var()
+        self.emit(indent, '%s = getattr(self, %r)(%s)', res, target._method_name(), value)
+        return res
+
+    def access(self, accessor, value, indent):
+        res, cls, get = self.var(), self.var(), self.var()
+        accessor = self.const(accessor)
+        self.emit(indent, '%s, %s = %s.spec', cls, get, accessor)
+        self.emit(indent, '%s = %s(%s) if type(%s) is %s else %s.resolve(%s)',
+                  res, get, value, value, cls, accessor, value)
+        return res
+
+    def _op_getattr(self, target, value, obj, indent, item):
+        if isinstance(item, str):
+            return self.access(_Accessor(item), value, indent)
+        res = self.var()
+        self.emit(indent, '%s = %s(%s)', res, self.const(_item(item)), value)
+        return res
+
+    def _op_invoke(self, target, value, obj, indent, args, kwargs):
+        res = self.var()
+        _args = [self.get(a, obj, indent) if isinstance(a, _Target) else self.const(a) for a in args]
+        _kwargs = ['%s: %s' % (self.get(k, obj, indent) if isinstance(k, _Target) else self.const(k),
+                               self.get(v, obj, indent) if isinstance(v, _Target) else self.const(v))
+                   for k, v in kwargs.items()]
+        self.emit(indent, '%s = %s(*[%s], **{%s})', res, value, ', '.join(_args), ', '.join(_kwargs))
+        return res
+
+    def _binary(self, value, obj, indent, other, symbol, reverse=False):
+        res, operand = self.var(), self.operand(other, obj, indent)
+        left, right = (operand, value) if reverse else (value, operand)
+        if isinstance(other, _Target):
+            self.emit(indent, '%s = _missing if %s is _missing else %s %s %s', res, operand, left, symbol, right)
+        else:
+            self.emit(indent, '%s = %s %s %s', res, left, symbol, right)
+        return res
+
+    def _op_add(self, target, value, obj, indent, other):
+        return self._binary(value, obj, indent, other, '+')
+
+    def _op_radd(self, target, value, obj, indent, other):
+        return self._binary(value, obj, indent, other, '+', reverse=True)
+
+    def _op_mul(self, target, value, obj, indent, other):
+        return self._binary(value, obj, indent, other, '*')
+
+    def _op_rmul(self, target, value, obj, indent, other):
+        return self._binary(value, obj, indent, other, '*', reverse=True)
+
+
+class _Unvectorizable(Exception):
+    pass
+
+
+class _Vectorizer:
+    """
+    Evaluates op chains over whole columns of NumPy arrays.
+    Raises _Unvectorizable for anything that needs the row engine.
+    """
+    _CASTS = {int: 'biufU', float: 'biufU', bool: 'biuf', str: 'biu'}
+    _CONTAINERS = (list, tuple, set, frozenset, dict)
+    # python values numpy compares with a column of each kind without converting it
+    _MEMBERS = {'b': (bool, int, float), 'i': (bool, int, float), 'u': (bool, int, float), 'f': (bool, int, float),
+                'U': (str,), 'S': (bytes,)}
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def value(self, value):
+        if isinstance(value, _Target):
+            return self.chain(value)
+        if isinstance(value, (dict, Reformer)):
+            raise _Unvectorizable(value)
+        return value
+
+    def chain(self, target):
+        if not isinstance(target, Field) or not target._path.accessors:
+            raise _Unvectorizable(target)
+        res = self.columns['.'.join(accessor.name for accessor in target._path.accessors)]
+        for op in target._ops:
+            method = getattr(self, '_op_' + op[0], None)
+            if method is None:
+                raise _Unvectorizable(op[0])
+            res = method(res, *op[1:])
+        return res
+
+    def operand(self, value):
+        return self.chain(value) if isinstance(value, _Target) else value
+
+    def arithmetic(self, op, left, right):
+        kinds = [operand.dtype.kind if isinstance(operand, numpy.ndarray) else type(operand).__name__
+                 for operand in (left, right)]
+        # numpy adds booleans with a logical or, python counts them
+        if 'b' in kinds or 'bool' in kinds:
+            raise _Unvectorizable(op)
+        res = op(left, right)
+        if res.dtype.kind in 'iu' and len(res):
+            # integer columns wrap around silently, results near the limits go to the row engine
+            approx = op(numpy.asarray(left, dtype=float), numpy.asarray(right, dtype=float))
+            limits = numpy.iinfo(res.dtype)
+            if approx.max() > limits.max / 2 or approx.min() < limits.min / 2:
+                raise _Unvectorizable(op)
+        return res
+
+    def _op_add(self, value, other):
+        return self.arithmetic(operator.add, value, self.operand(other))
+
+    def _op_radd(self, value, other):
+        return self.arithmetic(operator.add, self.operand(other), value)
+
+    def _op_mul(self, value, other):
+        return self.arithmetic(operator.mul, value, self.operand(other))
+
+    def _op_rmul(self, value, other):
+        return self.arithmetic(operator.mul, self.operand(other), value)
+
+    def _op_compare(self, value, item, operator):
+        if operator not in _OPERATORS:
+            raise _Unvectorizable(operator)
+        return operator(value, self.value(item))
+
+    def _op_at(self, value, container):
+        if not isinstance(container, self._CONTAINERS):
+            raise _Unvectorizable(container)
+        members = list(container)
+        # a mixed container would be converted to one type, e.g. all strings
+        if not all(type(member) in self._MEMBERS.get(value.dtype.kind, ()) for member in members):
+            raise _Unvectorizable(container)
+        return numpy.isin(value, members)
+
+    def _op_to(self, value, type):
+        if value.dtype.kind not in self._CASTS.get(type, ''):
+            raise _Unvectorizable(type)
+        if type is int and value.dtype.kind in 'fu' and len(value):
+            # nan, inf and values out of the int64 range don't convert exactly
+            limits = numpy.iinfo(numpy.int64)
+            if not numpy.isfinite(value).all() or value.max() > limits.max or value.min() < limits.min:
+                raise _Unvectorizable(type)
+        return value.astype(type)
+
+    def _op_map(self, value, choices, default):
+        if isinstance(choices, (list, tuple)):
+            if value.dtype.kind not in 'iu':
+                raise _Unvectorizable(choices)
+            table = _object_array(choices)
+            res = numpy.full(len(value), default, dtype=object)
+            mask = value < len(choices)
+            res[mask] = table[value[mask]]
+            return res
+        if isinstance(choices, dict):
+            keys, inverse = numpy.unique(value, return_inverse=True)
+            return _object_array([choices.get(key, default) for key in keys.tolist()])[inverse]
+        raise _Unvectorizable(choices)
+
+
+def _object_array(values):
+    res = numpy.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        res[i] = value
+    return res
+
+
+def _import_numpy():
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover
+            raise RuntimeError('transform_columns requires numpy')
+    return numpy
+
+
+def _import_asyncio():
+    global asyncio
+    if asyncio is None:
+        import asyncio
+    return asyncio
+
+
+def _is_coroutine(function):
+    return inspect.iscoroutinefunction(function) or inspect.iscoroutinefunction(getattr(function, '__call__', None))
+
+
+class _AsyncEvaluator:
+    """
+    Mirrors the closure engine for fields that await coroutine handlers or
+    methods. Fields without them are evaluated synchronously.
+    """
+
+    def __init__(self, reformer, semaphore):
+        self.reformer = reformer
+        self.semaphore = semaphore
+        self.cache = {}
+
+    def is_async(self, value):
+        key = id(value)
+        if key not in self.cache:
+            self.cache[key] = False
+            self.cache[key] = self._is_async(value)
+        return self.cache[key]
+
+    def _is_async(self, value):
+        if isinstance(value, Reformer):
+            evaluator = _AsyncEvaluator(value, self.semaphore)
+            return any(evaluator.is_async(getattr(type(value), attr)) for attr in value.__fields__)
+        if isinstance(value, dict):
+            return any(self.is_async(key) or self.is_async(val) for key, val in value.items())
+        if isinstance(value, (list, tuple)):
+            return any(self.is_async(val) for val in value)
+        if not isinstance(value, _Target):
+            return False
+        return any(self.is_async_op(value, op) for op in value._ops)
+
+    def is_async_op(self, target, op):
+        name = op[0]
+        if name == 'call':
+            return _is_coroutine(op[1])
+        if name == 'method':
+            return _is_coroutine(getattr(self.reformer, target._method_name(), None))
+        if name in ('as', 'iter', 'compare', 'invoke', 'add', 'radd', 'mul', 'rmul'):
+            return any(self.is_async(arg) for arg in op[1:])
+        return False
+
+    async def run(self, function, value):
+        if self.semaphore is None:
+            return await function(value)
+        async with self.semaphore:
+            return await function(value)
+
+    async def get(self, target, obj):
+        value = await self.chain(target, obj)
+        return target._absent() if value is _missing else value
+
+    async def chain(self, target, obj):
+        value = target._initial_getter(obj)
+        for op in target._ops:
+            if self.is_async_op(target, op):
+                if value is _missing:
+                    return value
+                value = await getattr(self, '_op_' + op[0])(target, value, obj, *op[1:])
+            else:
+                value = getattr(target, '_op_' + op[0])(lambda _: value, *op[1:])(obj)
+        return value
+
+    async def value(self, value, obj, item=None):
+        if isinstance(value, _Target):
+            source = item if item is not None and value._item else obj
+            if self.is_async(value):
+                return await self.get(value, source)
+            return value._get(source)
+        if isinstance(value, dict):
+            keys = await self.gather(value.keys(), obj, item)
+            values = await self.gather(value.values(), obj, item)
+            return self.reformer._output.inner.mapping(zip(keys, values))
+        if isinstance(value, Reformer):
+            return await value._bind(obj, self.reformer)._atransform(item or obj, self.semaphore)
+        return value
+
+    def gather(self, values, obj, item=None):
+        return asyncio.gather(*(self.value(value, obj, item) for value in values))
+
+    async def _op_call(self, target, value, obj, function):
+        return await self.run(function, value)
+
+    async def _op_method(self, target, value, obj):
+        return await self.run(getattr(self.reformer, target._method_name()), value)
+
+    async def _op_as(self, target, value, obj, schema):
+        if isinstance(schema, dict):
+            values = await self.gather(schema.values(), obj, value)
+            if _static_keys(schema):
+                return self.reformer._output.inner.factory('Record', schema)(*values)
+            keys = await self.gather(schema.keys(), obj, value)
+            return self.reformer._output.inner.mapping(zip(keys, values))
+        if isinstance(schema, (list, tuple)):
+            return type(schema)(await self.gather(schema, obj, value))
+        return await self.value(schema, obj, value)
+
+    async def _op_iter(self, target, value, obj, schema, condition, limit=None, offset=0, order_by=None,
+                       reverse=False):
+        if isinstance(value, dict):
+            value = [{'key': k, 'value': v} for k, v in value.items()]
+        items = list(value)
+        if condition:
+            checks = await asyncio.gather(*(self.value(condition, value, item) for item in items))
+            items = [item for item, check in zip(items, checks) if check]
+        if _windowed(limit, offset, order_by, reverse):
+            if order_by is not None:
+                keys = await asyncio.gather(*(self.value(order_by, value, item) for item in items))
+                keys = dict(zip(map(id, items), keys))
+                select = _selector(None, lambda obj, item: keys[id(item)], limit, offset, reverse)
+            else:
+                select = _selector(None, None, limit, offset, reverse)
+            items = list(select(value, items))
+        if isinstance(schema, dict):
+            _key, _value = list(schema.items())[0]
+            keys = await asyncio.gather(*(self.value(_key, value, item) for item in items))
+            values = await asyncio.gather(*(self.value(_value, value, item) for item in items))
+            return self.reformer._output.inner.mapping(zip(keys, values))
+        if isinstance(schema, (tuple, list)):
+            return type(schema)(await asyncio.gather(*(self.value(schema[0], value, item) for item in items)))
+
+    async def _op_compare(self, target, value, obj, item, operator):
+        return operator(value, await self.value(item, obj))
+
+    async def _op_invoke(self, target, value, obj, args, kwargs):
+        _args = await self.gather(args, obj)
+        _keys = await self.gather(kwargs.keys(), obj)
+        _values = await self.gather(kwargs.values(), obj)
+        return value(*_args, **dict(zip(_keys, _values)))
+
+    async def _binary(self, value, obj, other, operator, reverse=False):
+        other = await self.chain(other, obj) if isinstance(other, _Target) else other
+        if other is _missing:
+            return other
+        return operator(other, value) if reverse else operator(value, other)
+
+    async def _op_add(self, target, value, obj, other):
+        return await self._binary(value, obj, other, operator.add)
+
+    async def _op_radd(self, target, value, obj, other):
+        return await self._binary(value, obj, other, operator.add, reverse=True)
+
+    async def _op_mul(self, target, value, obj, other):
+        return await self._binary(value, obj, other, operator.mul)
+
+    async def _op_rmul(self, target, value, obj, other):
+        return await self._binary(value, obj, other, operator.mul, reverse=True)
+
+
+class _LazyRecord(Mapping):
+    """
+    A read-only record that evaluates each field on first access. Iterating
+    it evaluates the rest.
+    """
+    __slots__ = ('_reformer', '_target', '_values')
+
+    def __init__(self, reformer, target):
+        self._reformer = reformer
+        self._target = target
+        self._values = {}
+
+    def _value(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        reformer = self._reformer
+        if key not in reformer.__fields__:
+            raise KeyError(key)
+        token = _reformer.set(reformer)
+        try:
+            value = getattr(reformer, key)._get(self._target)
+        finally:
+            _reformer.reset(token)
+        if value is None and reformer._blank is not True:
+            value = reformer._blank or _missing
+        self._values[key] = value
+        return value
+
+    def __getitem__(self, key):
+        value = self._value(key)
+        if value is _missing:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        return (key for key in self._reformer.__fields__ if self._value(key) is not _missing)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self._reformer).__name__, dict(self))
+
+
+class _Projection:
+    """
+    Resolves ``only``/``exclude`` paths into a subclass of the schema with
+    the selected fields. Paths reaching into nested schemas and ``as_``
+    dicts rebuild the field with projected copies of them.
+    """
+
+    def __init__(self, schema, only, exclude):
+        self.source = schema
+        self.only, self.only_nested = self.split(only or ())
+        self.exclude, self.exclude_nested = self.split(exclude or ())
+        if only is None:
+            self.only = None
+
+    @staticmethod
+    def split(paths):
+        names, nested = set(), {}
+        for path in paths:
+            name, _, rest = path.partition('.')
+            if rest:
+                nested.setdefault(name, []).append(rest)
+            else:
+                names.add(name)
+        return names, nested
+
+    def selected(self, names):
+        """Kept names with the paths projected inside each of them."""
+        unknown = (self.only or set()).union(self.only_nested, self.exclude, self.exclude_nested) - set(names)
+        if unknown:
+            raise ValueError('%s has no field %r' % (getattr(self.source, '__name__', 'dict'), sorted(unknown)[0]))
+        for name in names:
+            if name in self.exclude or self.only is not None and name not in self.only and name not in self.only_nested:
+                continue
+            only = None if self.only is None or name in self.only else self.only_nested[name]
+            yield name, only, self.exclude_nested.get(name)
+
+    def schema(self):
+        cls, attrs, fields = self.source, OrderedDict(), []
+        for name, only, exclude in self.selected(cls.__fields__):
+            fields.append(name)
+            if only is not None or exclude:
+                attrs[name] = _project_field(getattr(cls, name), only, exclude)
+        projected = type(cls)(cls.__name__, (cls,), attrs)
+        projected.__qualname__ = cls.__qualname__
+        projected.__module__ = cls.__module__
+        setattr(projected, ATTR_NAME, fields)
+        return projected
+
+    def mapping(self):
+        keys = [key for key in self.source if isinstance(key, str)]
+        selected = {name: (only, exclude) for name, only, exclude in self.selected(keys)}
+        result = type(self.source)()
+        for key, value in self.source.items():
+            if not isinstance(key, str):
+                result[key] = value
+            elif key in selected:
+                result[key] = _project_value(value, *selected[key])
+        return result
+
+
+def _project_value(value, only, exclude):
+    if only is None and not exclude:
+        return value
+    if isinstance(value, Reformer):
+        projected = object.__new__(type(value)._project(only, exclude))
+        projected.__dict__.update(value.__dict__)
+        return projected
+    if isinstance(value, dict):
+        return _Projection(value, only, exclude).mapping()
+    if isinstance(value, (list, tuple)):
+        return type(value)(_project_value(item, only, exclude) for item in value)
+    if isinstance(value, _Target):
+        return _project_field(value, only, exclude)
+    raise ValueError('%r has no fields to project %r' % (value, sorted(chain(only or (), exclude or ()))[0]))
+
+
+def _project_field(field, only, exclude):
+    # the last as or iter gives the shape of the value, the paths apply to its schema
+    nested = [index for index, op in enumerate(field._ops) if op[0] in ('as', 'iter')]
+    if not nested:
+        path = field.__dict__.get('_path')
+        raise ValueError('Field %r has no nested schema to project %r' % (
+            field.__dict__.get('_name') or path and path.source, sorted(chain(only or (), exclude or ()))[0]))
+    projected = object.__new__(type(field))
+    projected.__dict__.update(field.__dict__)
+    projected.__dict__.pop('_getter', None)
+    projected._ops = []
+    for index, op in enumerate(field._ops):
+        if index == nested[-1]:
+            op = (op[0], _project_value(op[1], only, exclude)) + op[2:]
+        projected._push(*op)
+    return projected
+
+
+def _dependencies(value, base):
+    """
+    Source paths read by a value evaluated on the data at ``base``, a path
+    from the record or None for derived data, or None if it can't be told.
+    """
+    deps = set()
+    if isinstance(value, Reformer):
+        values = [(getattr(value, attr), base) for attr in value.__fields__]
+    elif isinstance(value, dict):
+        values = [(item, base) for pair in value.items() for item in pair]
+    elif isinstance(value, (list, tuple)):
+        values = [(item, base) for item in value]
+    elif isinstance(value, _Target):
+        return _target_dependencies(value, base if value._item else ())
+    else:
+        return deps
+    for item, base in values:
+        item_deps = _target_dependencies(item, base) if isinstance(value, Reformer) else _dependencies(item, base)
+        if item_deps is None:
+            return None
+        deps |= item_deps
+    return deps
+
+
+def _target_dependencies(target, base):
+    if isinstance(target, Field) and target._source is not None:
+        current = None if base is None else base + tuple(accessor.name for accessor in target._path.accessors)
+    elif target._initial_getter is _self:
+        current = base
+    else:
+        return None
+    deps = set()
+    for op in target._ops:
+        name, args = op[0], op[1:]
+        if name == 'getattr':
+            current = None if current is None else current + (args[0],)
+            continue
+        # handlers may read anything, memoized ones are declared pure
+        if name == 'method' or name == 'call' and not isinstance(args[0], _Memo):
+            return None
+        if name == 'as' and not (isinstance(args[0], Reformer) and args[0]._many):
+            inner = _dependencies(args[0], current)
+        else:
+            if current is not None:
+                # an invoked method reads the object it is bound to, not a key named after it
+                deps.add(current[:-1] if name == 'invoke' else current)
+            if name in ('as', 'iter'):
+                # items of a sequence are read at indexes not known here
+                inner = _dependencies(list(args), None)
+            elif name in ('compare', 'add', 'radd', 'mul', 'rmul'):
+                inner = _target_dependencies(args[0], ()) if isinstance(args[0], _Target) else set()
+            elif name == 'invoke':
+                inner = _dependencies([arg for arg in args[0]] + [item for pair in args[1].items() for item in pair],
+                                      ())
+            else:
+                inner = set()
+        if inner is None:
+            return None
+        deps |= inner
+        current = None
+    if current is not None:
+        deps.add(current)
+    return deps
+
+
+def _previous(record, index, attr):
+    if isinstance(record, Mapping):
+        return record.get(attr)
+    if isinstance(record, tuple):
+        return record[index]
+    return getattr(record, attr)
+
+
+def _pool(workers):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(workers)
+        return pool
+
+
+def _reset_pools():
+    # a forked child inherits the parent's pools but not their workers, it starts its own
+    global _pools_lock
+    _pools.clear()
+    _pools_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools)
+
+
+def _shippable(schema, kwargs):
+    # records of generated types can't be pickled back from the workers
+    output = _output(kwargs.get('output') or schema._output_)
+    if output.kind in ('namedtuple', 'slots'):
+        return False
+    try:
+        pickle.dumps((schema, kwargs))
+    except Exception:
+        return False
+    return True
+
+
+def _projected(schema, only, exclude):
+    return object.__new__(schema._project(only, exclude))
+
+
+def _transform_chunk(schema, kwargs, chunk):
+    return schema(**kwargs)._transform(chunk)
+
+
+@functools.lru_cache(maxsize=None)
+def _json_template(schema):
+    # escaped keys are baked into a %-template once per schema
+    keys = [json.dumps(key, ensure_ascii=False).replace('%', '%%') for key in schema.__fields__]
+    return '{%s}' % ','.join(key + ':%s' for key in keys), keys
+
+
+def _json_writer(schema, blank, default):
+    template, keys = _json_template(schema)
+    string = json.encoder.encode_basestring
+    encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=default).encode
+    literals = {None: 'null', True: 'true', False: 'false'}
+
+    def value(value):
+        cls = type(value)
+        if cls is str:
+            return string(value)
+        if cls is int:
+            return int.__repr__(value)
+        if value is None or cls is bool:
+            return literals[value]
+        return encode(value)
+
+    def write(row):
+        if not blank and None in row:
+            return '{%s}' % ','.join(key + ':' + value(val) for key, val in zip(keys, row) if val is not None)
+        return template % tuple(map(value, row))
+    return write
+
+
+def _dump_json(rows, sink, write, many, lines):
+    count = 0
+    separator = '\n' if lines else ','
+    if many and not lines:
+        sink.write(b'[')
+    for chunk in iter(lambda: list(islice(rows, CHUNK_SIZE)), []):
+        if count:
+            sink.write(separator.encode())
+        sink.write(separator.join(map(write, chunk)).encode('utf-8'))
+        count += len(chunk)
+    if many and not lines:
+        sink.write(b']')
+    elif lines and count:
+        sink.write(b'\n')
+    return count
+
+
+def _json_tree(deps):
+    """Nested dict of the keys a record is read at, None where all of it is read."""
+    tree = {}
+    for paths in deps.values():
+        if paths is None:
+            return None
+        for path in paths:
+            if not path:
+                return None
+            node = tree
+            for key in path[:-1]:
+                if key in node and node[key] is None:
+                    break
+                node = node.setdefault(key, {})
+            else:
+                node[path[-1]] = None
+    return tree
+
+
+def _json_buffer(source):
+    """Bytes of a json document, a file with a descriptor is memory-mapped."""
+    if isinstance(source, str):
+        return source.encode('utf-8')
+    if isinstance(source, (bytes, bytearray)):
+        return source
+    if isinstance(source, memoryview):
+        return source.tobytes()
+    try:
+        if source.tell() == 0:
+            return mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (AttributeError, OSError, ValueError):
+        pass
+    data = source.read()
+    return data.encode('utf-8') if isinstance(data, str) else data
+
+
+class _JsonReader:
+    """
+    Parses the parts of a json document a schema reads. Objects on the way
+    to read paths are built key by key, the values at read paths are parsed
+    by the json module and all other values are skipped by regex.
+    """
+    SPACE = re.compile(rb'[ \t\n\r]*')
+    STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+    # anything up to the next bracket that is not inside a string
+    BRACKET = re.compile(rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*(?:([\[{])|[\]}])', re.S)
+    SCALAR = re.compile(rb'[^,\]}\s]+')
+    KEY = re.compile(rb'("[^"\\]*(?:\\.[^"\\]*)*")[ \t\n\r]*:[ \t\n\r]*', re.S)
+    DELIMITER = re.compile(rb'[ \t\n\r]*([,}])[ \t\n\r]*')
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+
+    def error(self, message, pos):
+        before = bytes(self.buffer[:pos])
+        return ValueError('%s: line %d column %d (char %d)' % (
+            message, before.count(b'\n') + 1, pos - before.rfind(b'\n'), pos))
+
+    def space(self, pos):
+        return self.SPACE.match(self.buffer, pos).end()
+
+    def skip(self, pos):
+        """End of the value at ``pos``."""
+        char = self.buffer[pos:pos + 1]
+        if char == b'"':
+            match = self.STRING.match(self.buffer, pos)
+        elif char in (b'{', b'['):
+            depth = 0
+            for match in self.BRACKET.finditer(self.buffer, pos):
+                if match.lastindex:
+                    depth += 1
+                elif depth == 1:
+                    return match.end()
+                else:
+                    depth -= 1
+            raise self.error('Unterminated value', pos)
+        else:
+            match = self.SCALAR.match(self.buffer, pos)
+        if match is None:
+            raise self.error('Expecting value', pos)
+        return match.end()
+
+    def value(self, pos, tree):
+        """The value at ``pos`` with only the keys in ``tree`` and its end."""
+        pos = self.space(pos)
+        if tree is None or self.buffer[pos:pos + 1] != b'{':
+            end = self.skip(pos)
+            return json.loads(self.buffer[pos:end]), end
+        result = {}
+        pos = self.space(pos + 1)
+        if self.buffer[pos:pos + 1] == b'}':
+            return result, pos + 1
+        while True:
+            match = self.KEY.match(self.buffer, pos)
+            if match is None:
+                string = self.STRING.match(self.buffer, pos)
+                if string is None:
+                    raise self.error('Expecting property name enclosed in double quotes', pos)
+                raise self.error("Expecting ':' delimiter", self.space(string.end()))
+            key = match.group(1)
+            key = json.loads(key) if b'\\' in key else key[1:-1].decode('utf-8')
+            if key in tree:
+                result[key], pos = self.value(match.end(), tree[key])
+            else:
+                pos = self.skip(match.end())
+            match = self.DELIMITER.match(self.buffer, pos)
+            if match is None:
+                raise self.error("Expecting ',' delimiter", self.space(pos))
+            if match.group(1) == b'}':
+                return result, match.end()
+            pos = match.end()
+
+    def items(self, tree):
+        """Values of the top level array."""
+        pos = self.space(0)
+        if self.buffer[pos:pos + 1] != b'[':
+            raise self.error('Expecting a json array of records', pos)
+        pos = self.space(pos + 1)
+        if self.buffer[pos:pos + 1] == b']':
+            return self.end(pos + 1)
+        while True:
+            value, pos = self.value(pos, tree)
+            yield value
+            pos = self.space(pos)
+            char = self.buffer[pos:pos + 1]
+            if char == b']':
+                return self.end(pos + 1)
+            if char != b',':
+                raise self.error("Expecting ',' delimiter", pos)
+            pos += 1
+
+    def document(self, tree):
+        value, pos = self.value(0, tree)
+        self.end(pos)
+        return value
+
+    def end(self, pos):
+        pos = self.space(pos)
+        if pos != len(self.buffer):
+            raise self.error('Extra data', pos)
+
+
+def _dump_csv(rows, sink, fields):
+    text = io.TextIOWrapper(sink, encoding='utf-8', newline='')
+    try:
+        writer = csv.writer(text)
+        writer.writerow(fields)
+        count = 0
+        for chunk in iter(lambda: list(islice(rows, CHUNK_SIZE)), []):
+            writer.writerows(chunk)
+            count += len(chunk)
+        text.flush()
+        return count
+    finally:
+        text.detach()
+
+
+def _class_attr(cls, name):
+    for klass in cls.__mro__:
+        if name in klass.__dict__:
+            return klass.__dict__[name]
+    raise AttributeError(name)
 
 
 class Field(_Target):
 
     def __init__(self, source=None, schema=None, to=None,
-                 handler=None, choices=None, required=True, default=None):
+                 handler=None, choices=None, required=True, default=None, cache=None):
         self._name = None
-        self._source = source
-
-        def initial_getter(obj):
-            result = obj
-            for _source in self._source.split('.'):
-                if _source in ['self']:
-                    continue
-                if hasattr(result, _source):
-                    result = getattr(result, _source)
-                else:
-                    result = result[_source]
-            return result
-        super().__init__(getter=initial_getter)
+        self._path = _Path(source)
+        super().__init__(getter=self._path)
         self.set_as_item()
         self.set_default(default)
         if not required:
             self.set_null()
 
         if to is not None:
-            self.to(to)
+            self.to(to, cache=cache)
         if handler is not None:
-            self.handle(handler)
+            self.handle(handler, cache=cache)
         if schema is not None:
             self.as_(schema=schema)
         if choices is not None:
             self.map(choices, default=default)
 
-    def iter(self, schema, condition=None):
+    @property
+    def _source(self):
+        return self._path.source
+
+    @_source.setter
+    def _source(self, source):
+        self._path.parse(source)
+
+    def iter(self, schema, condition=None, limit=None, offset=0, order_by=None, reverse=False):
         if isinstance(schema, set):
             _schema = {}
             for source in schema:
@@ -312,7 +2017,8 @@ class Field(_Target):
                 else:
                     _schema.append(Field(source))
             schema = _schema
-        return super().iter(schema, condition=condition)
+        return super().iter(schema, condition=condition, limit=limit, offset=offset, order_by=order_by,
+                            reverse=reverse)
 
 
 class MapField(Field):
@@ -345,47 +2051,473 @@ class MethodField(Field):
 
     def __init__(self, source=None):
         self._method_source = source
-        self.__instance = None
-        super().__init__('self', handler=self.__handler)
+        super().__init__('self')
+        self._push('method')
 
-    def __handler(self, obj):
-        method_name = self._method_source or'get_' + self._name
-        method = getattr(self.__instance, method_name)
-        return method(obj)
+    def _method_name(self):
+        return self._method_source or 'get_' + self._name
 
-    def __get__(self, instance, owner):
-        if owner is None:
-            return self
-        self.__instance = instance
-        return self
+    def _op_method(self, getter):
+
+        def _getter(obj):
+            obj = getter(obj)
+            if obj is _missing:
+                return obj
+            method = getattr(_reformer.get(None), self._method_name())
+            return method(obj)
+        return _getter
+
+
+class Instrument:
+    """
+    Call counts, cumulative seconds and errors of records (keyed by schema
+    name) and fields (keyed by ``Schema.field``). The callback is called
+    with the key, seconds and whether it raised on each measurement.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def measure(self, key, get, target):
+        start = time.perf_counter()
+        error = True
+        try:
+            value = get(target)
+            error = False
+            return value
+        finally:
+            self.add(key, time.perf_counter() - start, error)
+
+    def add(self, key, seconds, error=False):
+        with self._lock:
+            calls, total, errors = self._stats.get(key, (0, 0.0, 0))
+            self._stats[key] = FieldStats(calls + 1, total + seconds, errors + error)
+        if self.callback is not None:
+            self.callback(key, seconds, error)
+
+    def stats(self):
+        with self._lock:
+            return OrderedDict(sorted(self._stats.items()))
+
+
+@contextlib.contextmanager
+def instrument(callback=None):
+    """Instrument transforms of all schemas started inside the block."""
+    collector = Instrument(callback)
+    token = _instrument.set(collector)
+    try:
+        yield collector
+    finally:
+        _instrument.reset(token)
+
+
+def warmup(schemas, output=None):
+    """
+    Prepares schemas ahead of their first transform, e.g. in a server before
+    it forks workers. Instances are prepared for their own output.
+    """
+    for schema in schemas:
+        if isinstance(schema, Reformer):
+            schema._warmup(schema._output)
+        else:
+            schema._warmup(_output(schema._output_ if output is None else output))
 
 
 class Reformer(metaclass=_ReformerMeta):
     _fields_ = ()
-
-    def __init__(self, many=False, blank=True, content=None):
+    _compile_ = True
+    _output_ = OrderedDict
+    _cache_dir_ = os.environ.get('REFORMER_CACHE_DIR')
+
+    def __init__(self, many=False, blank=True, content=None, output=None, instrument=None, lazy=False,
+                 only=None, exclude=None):
+        if only is not None or exclude:
+            self.__class__ = type(self)._project(only, exclude)
         self.content = content or {}
         self._blank = blank
         self._many = many
+        self._lazy = lazy
+        self._output = _output(self._output_ if output is None else output)
+        if instrument is not None and not isinstance(instrument, Instrument):
+            instrument = Instrument(instrument)
+        self._instrument = _instrument.get() if instrument is None else instrument
+
+    def __reduce_ex__(self, protocol):
+        # projections are generated classes, they are projected again on load
+        projection = type(self).__dict__.get(PROJECTION_ATTR)
+        if projection is None:
+            return super().__reduce_ex__(protocol)
+        return _projected, projection, self.__dict__
 
     @classmethod
-    def transform(cls, _target, **kwargs):
+    def transform(cls, _target, workers=None, chunk_size=CHUNK_SIZE, **kwargs):
+        if workers and kwargs.get('many') and not kwargs.get('lazy') and _instrument.get() is None \
+                and _shippable(cls, kwargs):
+            return cls._transform_parallel(_target, workers, chunk_size, kwargs)
         return cls(**kwargs)._transform(_target)
 
-    def _transform(self, target):
-        if self._many:
-            self._many = False
-            return [self._transform(item) for item in target]
+    @classmethod
+    def _transform_parallel(cls, targets, workers, chunk_size, kwargs):
+        targets = iter(targets)
+        chunks = iter(lambda: list(islice(targets, chunk_size)), [])
+        first = next(chunks, [])
+        if len(first) < chunk_size:
+            return cls(**kwargs)._transform(first)
+        pool = _pool(workers)
+        chunks = chain([first], chunks)
+        try:
+            results = pool.map(_transform_chunk, repeat(cls), repeat(kwargs), chunks)
+            return [record for chunk in results for record in chunk]
+        except BrokenProcessPool:
+            with _pools_lock:
+                if _pools.get(workers) is pool:
+                    del _pools[workers]
+            raise
+
+    @classmethod
+    def transform_iter(cls, _targets, chunk_size=None, **kwargs):
+        kwargs.pop('many', None)
+        records = map(cls(**kwargs)._transform_one, _targets)
+        if not chunk_size:
+            return records
+        return iter(lambda: list(islice(records, chunk_size)), [])
+
+    @classmethod
+    def transform_json(cls, source, **kwargs):
+        reformer = cls(**kwargs)
+        buffer = _json_buffer(source)
+        try:
+            reader = _JsonReader(buffer)
+            tree = _json_tree(type(reformer)._dependency_map())
+            return reformer._transform(reader.items(tree) if reformer._many else reader.document(tree))
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    @classmethod
+    def dump(cls, _target, sink, format='json', compress=False, default=None, **kwargs):
+        if format not in ('json', 'ndjson', 'csv'):
+            raise ValueError("Unknown format %r, expected 'json', 'ndjson' or 'csv'" % (format,))
+        kwargs.pop('output', None)
+        kwargs.pop('lazy', None)
+        reformer = cls(**kwargs)
+        reformer._output = _OUTPUTS['row']
+        many = reformer._many
+        rows = map(reformer._transform_one, _target if many else [_target])
+        raw = open(sink, 'wb') if isinstance(sink, (str, os.PathLike)) else sink
+        try:
+            out = raw
+            if compress:
+                out = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9 if compress is True else compress)
+            try:
+                if format == 'csv':
+                    return _dump_csv(rows, out, reformer.__fields__)
+                write = _json_writer(type(reformer), reformer._blank, default)
+                return _dump_json(rows, out, write, many, format == 'ndjson')
+            finally:
+                if out is not raw:
+                    out.close()
+        finally:
+            if raw is not sink:
+                raw.close()
+
+    @classmethod
+    def transform_columns(cls, columns, **kwargs):
+        _import_numpy()
+        if isinstance(columns, numpy.ndarray):
+            columns = OrderedDict((name, columns[name]) for name in columns.dtype.names)
+        vectorizer = _Vectorizer(columns)
+        rows = None
         result = OrderedDict()
-        for attr in self.__fields__:
-            value = getattr(self, attr)._get(target)
+        reformer = cls(**kwargs)
+        token = _reformer.set(reformer)
+        try:
+            for attr in reformer.__fields__:
+                field = getattr(reformer, attr)
+                try:
+                    result[attr] = vectorizer.chain(field)
+                except Exception:
+                    # the row engine reproduces defaults, nulls and errors exactly
+                    if rows is None:
+                        names = list(columns)
+                        rows = [dict(zip(names, row)) for row in zip(*(columns[name].tolist() for name in names))]
+                    result[attr] = _object_array([field._get(row) for row in rows])
+        finally:
+            _reformer.reset(token)
+        return result
+
+    @classmethod
+    async def transform_async(cls, _target, concurrency=None, **kwargs):
+        _import_asyncio()
+        semaphore = asyncio.Semaphore(concurrency) if concurrency else None
+        return await cls(**kwargs)._atransform(_target, semaphore)
+
+    atransform = transform_async
+
+    @classmethod
+    def cache_info(cls):
+        info = OrderedDict()
+        for attr in cls.__fields__:
+            memos = [memo.cache_info() for memo in _memos(getattr(cls, attr))]
+            if memos:
+                info[attr] = CacheInfo(*map(sum, zip(*memos)))
+        return info
+
+    @classmethod
+    def _project(cls, only=None, exclude=None):
+        key = (None if only is None else frozenset(only), frozenset(exclude or ()))
+        projections = cls.__dict__.get(PROJECTIONS_ATTR)
+        if projections is None:
+            projections = {}
+            setattr(cls, PROJECTIONS_ATTR, projections)
+        projected = projections.get(key)
+        if projected is None:
+            projected = _Projection(cls, only, exclude).schema()
+            setattr(projected, PROJECTION_ATTR, (cls,) + key)
+            projected = projections.setdefault(key, projected)
+        return projected
+
+    @classmethod
+    def retransform(cls, _target, previous, changed, **kwargs):
+        reformer = cls(**kwargs)
+        dirty = reformer._dirty(changed)
+        if reformer._many:
+            return [reformer._retransform_one(target, record, dirty) for target, record in zip(_target, previous)]
+        return reformer._retransform_one(_target, previous, dirty)
+
+    @classmethod
+    def _dependency_map(cls):
+        deps = cls.__dict__.get(DEPENDENCIES_ATTR)
+        if deps is None:
+            deps = {}
+            for attr in cls.__fields__:
+                paths = _target_dependencies(getattr(cls, attr), ())
+                deps[attr] = None if paths is None else {tuple(str(name) for name in path) for path in paths}
+            setattr(cls, DEPENDENCIES_ATTR, deps)
+        return deps
+
+    def _dirty(self, changed):
+        changed = [tuple(path.split('.')) for path in changed]
+        return {
+            attr for attr, paths in self._dependency_map().items()
+            if paths is None or any(path[:len(key)] == key or key[:len(path)] == path
+                                    for path in paths for key in changed)
+        }
+
+    def _retransform_one(self, target, previous, dirty):
+        token = _reformer.set(self)
+        try:
+            return self._record([
+                getattr(self, attr)._get(target) if attr in dirty else _previous(previous, index, attr)
+                for index, attr in enumerate(self.__fields__)
+            ])
+        finally:
+            _reformer.reset(token)
+
+    @classmethod
+    def _compiled(cls, output):
+        compiled = cls.__dict__.get(COMPILED_ATTR)
+        if compiled is None or output.kind not in compiled:
+            with _compile_lock:
+                compiled = dict(cls.__dict__.get(COMPILED_ATTR) or {})
+                if output.kind not in compiled:
+                    compiled[output.kind] = _Compiler(cls, output).compile()
+                    setattr(cls, COMPILED_ATTR, compiled)
+        return compiled[output.kind]
+
+    @classmethod
+    def _warmup(cls, output):
+        for attr in cls.__fields__:
+            for part in _parts(getattr(cls, attr)):
+                if isinstance(part, Reformer):
+                    # nested schemas run with the inner output of their owner
+                    type(part)._warmup(output.inner)
+                else:
+                    part._getter
+        if cls._compile_:
+            cls._compiled(output)
+
+    def _bind(self, parent, owner):
+        reformer = object.__new__(type(self))
+        reformer.__dict__.update(self.__dict__)
+        reformer.content = dict(self.content, parent=parent)
+        if owner is not None:
+            reformer._output = owner._output.inner
+            reformer._instrument = owner._instrument
+        return reformer
+
+    def _record(self, values):
+        blank = self._blank
+        if self._output.fixed:
+            fill = blank if blank and blank is not True else None
+            factory = self._output.factory(type(self).__name__, self.__fields__)
+            return factory(*[fill if value is None else value for value in values])
+        result = self._output.mapping()
+        for attr, value in zip(self.__fields__, values):
             if value is None:
-                if self._blank and self._blank is not True:
-                    result[attr] = self._blank
-                elif self._blank:
+                if blank and blank is not True:
+                    result[attr] = blank
+                elif blank:
                     result[attr] = None
             else:
                 result[attr] = value
         return result
 
+    def _transform(self, target):
+        if self._many:
+            return [self._transform_one(item) for item in target]
+        return self._transform_one(target)
+
+    def _transform_one(self, target):
+        if self._lazy:
+            return _LazyRecord(self, target)
+        if self._instrument is not None:
+            return self._transform_instrumented(target)
+        if self._compile_:
+            return self._compiled(self._output)(self, target)
+        token = _reformer.set(self)
+        try:
+            return self._record([getattr(self, attr)._get(target) for attr in self.__fields__])
+        finally:
+            _reformer.reset(token)
+
+    def _transform_instrumented(self, target):
+        # fields run one by one through the closure engine to be timed apart
+        measure = self._instrument.measure
+        name = type(self).__name__
+        token = _reformer.set(self)
+        try:
+            return measure(name, lambda target: self._record([
+                measure('%s.%s' % (name, attr), getattr(self, attr)._get, target) for attr in self.__fields__
+            ]), target)
+        finally:
+            _reformer.reset(token)
+
+    async def _atransform(self, target, semaphore):
+        if self._many:
+            return list(await asyncio.gather(*(self._atransform_one(item, semaphore) for item in target)))
+        return await self._atransform_one(target, semaphore)
+
+    async def _atransform_one(self, target, semaphore):
+        evaluator = _AsyncEvaluator(self, semaphore)
+        token = _reformer.set(self)
+        try:
+            values, pending = [], []
+            for attr in self.__fields__:
+                field = getattr(self, attr)
+                if evaluator.is_async(field):
+                    pending.append((len(values), evaluator.get(field, target)))
+                    values.append(None)
+                else:
+                    values.append(field._get(target))
+            for index, value in zip([index for index, _ in pending],
+                                    await asyncio.gather(*(coroutine for _, coroutine in pending))):
+                values[index] = value
+        finally:
+            _reformer.reset(token)
+        return self._record(values)
+
     __call__ = _transform
+
+
+def _load_schema(spec):
+    module, _, name = spec.partition(':')
+    if not module or not name:
+        raise ValueError('Expected module:Schema, got %r' % (spec,))
+    schema = importlib.import_module(module)
+    for attr in name.split('.'):
+        schema = getattr(schema, attr)
+    return schema
+
+
+def _line_chunks(buffer, size):
+    """Slices of about ``size`` bytes that end at a newline."""
+    start, length = 0, len(buffer)
+    while start < length:
+        end = buffer.find(b'\n', start + size - 1) + 1 if start + size < length else length
+        end = end or length
+        yield buffer[start:end]
+        start = end
+
+
+def _transform_lines(schema, chunk):
+    records = [json.loads(line) for line in chunk.splitlines() if line.strip()]
+    sink = io.BytesIO()
+    count = schema.dump(records, sink, format='ndjson', many=True)
+    return sink.getvalue(), count
+
+
+def _transform_ndjson(schema, buffer, sink, workers, chunk_size, ordered):
+    chunks = _line_chunks(buffer, chunk_size)
+    if workers <= 1:
+        count = 0
+        for chunk in chunks:
+            data, records = _transform_lines(schema, chunk)
+            sink.write(data)
+            count += records
+        return count
+
+    def write(future):
+        data, records = future.result()
+        sink.write(data)
+        return records
+
+    count = 0
+    with ProcessPoolExecutor(workers) as pool:
+        # a few chunks per worker are in flight, the rest of the file stays mapped
+        pending = deque() if ordered else set()
+        for chunk in chunks:
+            if len(pending) >= workers * 2:
+                if ordered:
+                    count += write(pending.popleft())
+                else:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    count += sum(map(write, done))
+            future = pool.submit(_transform_lines, schema, chunk)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+        for future in pending:
+            count += write(future)
+    return count
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='python -m reformer', description='Transform a file of json lines.')
+    parser.add_argument('schema', help='schema to transform records with, as module:Schema')
+    parser.add_argument('input', help='file with one json record per line')
+    parser.add_argument('output', help='file to write transformed records to, one per line')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes, 1 runs in process')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_BYTES, help='bytes of input per task')
+    parser.add_argument('--unordered', action='store_true', help='write chunks in the order they finish')
+    args = parser.parse_args(argv)
+    if args.chunk_size < 1:
+        parser.error('--chunk-size must be positive')
+    try:
+        schema = _load_schema(args.schema)
+    except (ImportError, AttributeError, ValueError) as exc:
+        parser.error(str(exc))
+
+    start = time.perf_counter()
+    with open(args.input, 'rb') as source, open(args.output, 'wb') as sink:
+        size = os.fstat(source.fileno()).st_size
+        buffer = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        try:
+            count = _transform_ndjson(schema, buffer, sink, args.workers, args.chunk_size, not args.unordered)
+        finally:
+            if size:
+                buffer.close()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    print('%d records, %.1f MB in %.2f s: %.0f records/s, %.1f MB/s' % (
+        count, size / 1e6, elapsed, count / elapsed, size / 1e6 / elapsed), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    # run in the imported module, so schemas and workers share its classes
+    import reformer
+    sys.exit(reformer.main())
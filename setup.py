@@ -6,6 +6,8 @@ setup(
     name='reformer',
     version=VERSION,
     py_modules=['reformer'],
+    python_requires='>=3.7',
+    extras_require={'numpy': ['numpy']},
     url='https://github.com/Krukov/reformer',
     download_url='https://github.com/Krukov/reformer/tarball/' + VERSION,
     license='MIT',
@@ -20,9 +22,8 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
         'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
         'Topic :: Software Development :: Libraries :: Python Modules', 
     ],
 )
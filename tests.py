@@ -1,9 +1,58 @@
 
+import gzip
+import io
+import json
+import os
+import pickle
+import signal
+import sys
+import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 
-from reformer import Reformer as R, Field, MethodField
+from reformer import Reformer as R, Field, MethodField, Instrument, instrument, MissingValueError
+
+
+class Parallel(R):
+    name = Field('name').upper()
+    double = Field('value') * 2
+
+
+def title(value):
+    return value.title()
+
+
+class Line(R):
+    sku = Field('sku')
+    total = Field('price') * Field('count')
+
+
+class Pickled(R):
+    name = Field('name').upper()
+    titled = Field('name').call(title)
+    price = 2 * Field('price', to=int, cache=True) + 1
+    label = 'price: ' + Field('price') * 1
+    status = Field('status').map({1: 'active'}, default='unknown')
+    big = Field('price') > '5'
+    known = Field('status').at([1, 2])
+    tagged = Field('tags').contains('a')
+    first = Field('tags')[0]
+    lines = Field('lines').as_(Line(many=True))
+    skus = Field('lines').iter([Field('sku')], condition=Field('count') > 1, order_by=Field('price'), limit=2)
+    shape = Field('self').as_({'n': Field('name'), 'both': [Field('price'), Field('status')]})
+    city = Field('address.city', required=False)
+    note = MethodField()
+
+    def get_note(self, obj):
+        return len(obj['tags'])
+
+
+@pytest.fixture(autouse=True, params=[True, False], ids=['compiled', 'closure'])
+def engine(request, monkeypatch):
+    monkeypatch.setattr(R, '_compile_', request.param)
+    return request.param
 
 
 def test_simple_value_link():
@@ -658,3 +707,795 @@ def test_field_sub_map():
         test = Field('key').as_(SubMap())
 
     assert Map.transform(target) == expect
+
+
+def test_compiled_engine_matches_closure():
+    target = {
+        'name': 'test', 'val': 10,
+        'fields': [{'type': 'int', 'val': '10'}, {'type': 'str', 'val': 'x'}],
+    }
+
+    class Map(R):
+        test = '* ' + Field("name") + '_' + Field("val").to_str()
+        res = Field("fields").iter([
+            Field("self").as_({'type': Field("type"), 'val': Field("val")})
+        ], Field("type") == 'int')
+        missing = Field("missing").set_null()
+
+    Map._compile_ = True
+    compiled = Map.transform(target)
+    Map._compile_ = False
+    assert list(compiled.items()) == list(Map.transform(target).items())
+
+
+def test_dot_sep_field_mixed_types():
+    class Name:
+        first = 'John'
+
+    targets = [
+        {'name': {'first': 'Jack'}},
+        type('User', (), {'name': Name()})(),
+        {'name': OrderedDict(first='Jane')},
+        {'name': {'first': 'Jill'}},
+    ]
+    expect = [{'first': 'Jack'}, {'first': 'John'}, {'first': 'Jane'}, {'first': 'Jill'}]
+
+    class Map(R):
+        first = Field('name.first')
+
+    assert Map.transform(targets, many=True) == expect
+
+
+def test_transform_iter():
+    consumed = []
+
+    def targets():
+        for i in range(5):
+            consumed.append(i)
+            yield {'value': i}
+
+    class Map(R):
+        double = Field('value') * 2
+
+    records = Map.transform_iter(targets())
+    assert next(records) == {'double': 0}
+    assert consumed == [0]
+    assert list(records) == [{'double': 2}, {'double': 4}, {'double': 6}, {'double': 8}]
+
+    chunks = Map.transform_iter(targets(), chunk_size=2)
+    assert list(chunks) == [
+        [{'double': 0}, {'double': 2}],
+        [{'double': 4}, {'double': 6}],
+        [{'double': 8}],
+    ]
+
+
+def test_nested_many_keeps_many():
+    target = {'groups': [{'users': [{'name': 'a'}]}, {'users': [{'name': 'b'}, {'name': 'c'}]}]}
+    expect = {'groups': [[{'name': 'a'}], [{'name': 'b'}, {'name': 'c'}]]}
+
+    class User(R):
+        name = Field()
+
+    class Map(R):
+        groups = Field('groups').iter([Field('users').as_(User(many=True))])
+
+    assert Map.transform(target) == expect
+
+
+def test_transform_columns():
+    numpy = pytest.importorskip('numpy')
+    columns = {
+        'name': numpy.array(['a', 'b', 'c']),
+        'val': numpy.array([1, 5, 10]),
+        'type': numpy.array([0, 1, 3]),
+    }
+    expect = {
+        'double': [2, 10, 20],
+        'big': [True, True, False],
+        'kind': ['str', 'int', None],
+        'letter': ['A', 'B', None],
+        'inside': [True, True, False],
+        'upper': ['A', 'B', 'C'],
+        'missing': [None, None, None],
+    }
+
+    class Map(R):
+        double = Field('val') * 2
+        big = Field('val') > Field('type') * 4
+        kind = Field('type').map(['str', 'int'])
+        letter = Field('name').map({'a': 'A', 'b': 'B'})
+        inside = Field('val').at([1, 5])
+        upper = Field('name').upper()
+        missing = Field('nothing').set_null()
+
+    result = Map.transform_columns(columns)
+    assert {key: value.tolist() for key, value in result.items()} == expect
+    assert result['double'].dtype.kind == 'i'
+    assert result['upper'].dtype == object
+
+    class Double(R):
+        double = Field('val') * 2
+
+    structured = numpy.array([(1, 0), (5, 1)], dtype=[('val', int), ('type', int)])
+    assert Double.transform_columns(structured)['double'].tolist() == [2, 10]
+
+    # results numpy can't give exactly come from the row engine
+    class Exact(R):
+        mixed = Field('val').at([1, 'a'])
+        huge = Field('val') * 10 ** 18
+        count = Field('flag') + Field('flag')
+        whole = Field('ratio').to(int)
+
+    result = Exact.transform_columns({'val': numpy.array([1, 5, 10]), 'flag': numpy.array([True, True, False]),
+                                      'ratio': numpy.array([1.5, -2.5, 3.0])})
+    assert {key: value.tolist() for key, value in result.items()} == {
+        'mixed': [True, False, False], 'huge': [10 ** 18, 5 * 10 ** 18, 10 ** 19], 'count': [2, 2, 0],
+        'whole': [1, -2, 3]}
+    for ratio in (numpy.nan, numpy.inf):
+        with pytest.raises((ValueError, OverflowError)):
+            Exact.transform_columns({'val': numpy.array([1]), 'flag': numpy.array([True]),
+                                     'ratio': numpy.array([ratio])})
+
+
+def test_parallel_transform():
+    targets = [{'name': 'n%d' % i, 'value': i} for i in range(25)]
+    expect = [{'name': 'N%d' % i, 'double': i * 2} for i in range(25)]
+
+    assert Parallel.transform(targets, many=True, workers=2, chunk_size=4) == expect
+    assert Parallel.transform(iter(targets), many=True, workers=2, chunk_size=4) == expect
+
+    class Local(R):
+        double = Field('value') * 2
+
+    result = Local.transform(targets, many=True, workers=2, chunk_size=4)
+    assert result == [{'double': i * 2} for i in range(25)]
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_parallel_transform_after_fork():
+    import reformer
+
+    targets = [{'name': 'n%d' % i, 'value': i} for i in range(25)]
+    expect = [{'name': 'N%d' % i, 'double': i * 2} for i in range(25)]
+    assert Parallel.transform(targets, many=True, workers=2, chunk_size=4) == expect
+
+    pid = os.fork()
+    if not pid:
+        ok = False
+        try:
+            ok = Parallel.transform(targets, many=True, workers=2, chunk_size=4) == expect
+        finally:
+            for pool in reformer._pools.values():
+                pool.shutdown()
+            os._exit(0 if ok else 1)
+    for _ in range(300):
+        done, status = os.waitpid(pid, os.WNOHANG)
+        if done:
+            break
+        time.sleep(0.1)
+    else:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        pytest.fail('the forked child hung')
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+
+
+def test_threads_share_schema():
+    class Line(R):
+        sku = Field('sku')
+        order = MethodField()
+
+        def get_order(self, obj):
+            return self.content['parent']['id']
+
+    class Map(R):
+        id = Field('id')
+        tag = MethodField()
+        lines = Field('lines').as_(Line(many=True))
+
+        def get_tag(self, obj):
+            return self.content['tag']
+
+    def run(i):
+        target = {'id': i, 'lines': [{'sku': 'a%d' % i}, {'sku': 'b%d' % i}]}
+        expect = {'id': i, 'tag': i, 'lines': [
+            {'sku': 'a%d' % i, 'order': i},
+            {'sku': 'b%d' % i, 'order': i},
+        ]}
+        return Map.transform(target, content={'tag': i}) == expect
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ThreadPoolExecutor(16) as pool:
+            assert all(pool.map(run, range(2000)))
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_transform_async():
+    import asyncio
+
+    running = []
+    peak = []
+
+    async def reverse(name):
+        running.append(name)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(name)
+        return ''.join(reversed(name))
+
+    class Tag(R):
+        name = Field('name').handle(reverse)
+
+    class Map(R):
+        name = Field('name')
+        reversed = Field('name', handler=reverse).upper()
+        tags = Field('tags').iter([Field('self').as_(Tag())])
+        status = MethodField()
+
+        async def get_status(self, obj):
+            await asyncio.sleep(0.01)
+            return obj['name'] + '!'
+
+    targets = [{'name': 'n%d' % i, 'tags': [{'name': 'a%d' % i}, {'name': 'b%d' % i}]} for i in range(10)]
+    expect = [{
+        'name': 'n%d' % i,
+        'reversed': '%dN' % i,
+        'tags': [{'name': '%da' % i}, {'name': '%db' % i}],
+        'status': 'n%d!' % i,
+    } for i in range(10)]
+
+    result = asyncio.run(Map.transform_async(targets, many=True, concurrency=4))
+    assert result == expect
+    assert list(result[0]) == ['name', 'reversed', 'tags', 'status']
+    assert max(peak) == 4
+    assert asyncio.run(Map.atransform(targets[0])) == expect[0]
+
+
+def test_cached_steps():
+    calls = []
+
+    def make_slug(name):
+        calls.append(name)
+        return name.lower().replace(' ', '-')
+
+    targets = [{'name': 'Big Sale', 'tags': ['a']}, {'name': 'Big Sale', 'tags': ['b']},
+               {'name': 'New', 'tags': ['a']}, {'name': 'Big Sale', 'tags': ['a']}]
+
+    class Map(R):
+        slug = Field('name').call(make_slug, cache=True)
+        count = Field('tags', handler=len, cache=2)
+        flag = Field('name').to(bool, cache=True)
+        plain = Field('name').call(len)
+
+    result = Map.transform(targets, many=True)
+    assert [r['slug'] for r in result] == ['big-sale', 'big-sale', 'new', 'big-sale']
+    assert calls == ['Big Sale', 'New']
+
+    info = Map.cache_info()
+    assert list(info) == ['slug', 'count', 'flag']
+    assert info['slug'][:3] == (2, 2, 0)
+    assert info['count'][:3] == (0, 0, 4)
+    assert info['flag'].maxsize == 1024
+
+
+def test_shared_paths_evaluated_once(engine):
+    reads = []
+
+    class Order:
+        @property
+        def customer(self):
+            reads.append('customer')
+            return {'name': 'Jack', 'address': {'city': 'Oslo', 'zip': '0150'}}
+
+    class Map(R):
+        name = Field('customer.name')
+        city = Field('customer').address.city
+        zip = Field('customer.address.zip')
+        label = Field('customer.name') + ', ' + Field('customer.address.city')
+        phone = Field('customer.phone').set_null()
+
+    expect = {'name': 'Jack', 'city': 'Oslo', 'zip': '0150', 'label': 'Jack, Oslo', 'phone': None}
+    assert Map.transform(Order()) == expect
+    assert len(reads) == (1 if engine else 6)
+
+
+@pytest.mark.parametrize('output', [dict, OrderedDict, tuple, 'namedtuple', 'slots'])
+def test_output_containers(output):
+
+    class Line(R):
+        sku = Field('sku')
+        qty = Field('qty')
+
+    class Map(R):
+        _output_ = output
+
+        id = Field('id')
+        note = Field('note')
+        lines = Field('lines').as_(Line(many=True))
+        point = Field('point').as_({'x': Field('lat'), 'y': Field('lon')})
+        tags = Field('tags').iter({Field('key'): Field('value')})
+
+    target = {'id': 1, 'note': None, 'point': {'lat': 2, 'lon': 3}, 'tags': {'a': 1},
+              'lines': [{'sku': 'x', 'qty': 2}]}
+    result = Map.transform(target)
+    blank = Map.transform(target, blank='-')
+    if output in (dict, OrderedDict):
+        assert blank['note'] == '-'
+        assert type(result) is output and type(result['lines'][0]) is output
+        assert result == {'id': 1, 'note': None, 'lines': [{'sku': 'x', 'qty': 2}],
+                          'point': {'x': 2, 'y': 3}, 'tags': {'a': 1}}
+        return
+    if output is tuple:
+        assert blank[1] == '-'
+        assert result == (1, None, [('x', 2)], (2, 3), {'a': 1})
+        return
+    assert (result.id, result.note, result.tags, blank.note) == (1, None, {'a': 1}, '-')
+    assert (result.lines[0].sku, result.lines[0].qty) == ('x', 2)
+    assert (result.point.x, result.point.y) == (2, 3)
+    assert type(result) is type(Map.transform(target)) and result == Map.transform(target)
+    assert type(result.tags) is dict
+
+
+def test_output_argument():
+
+    class Map(R):
+        id = Field('id')
+
+    assert Map.transform({'id': 1}, output=tuple) == (1,)
+    assert Map.transform({'id': 1}, output='namedtuple').id == 1
+    with pytest.raises(ValueError):
+        Map(output=list)
+
+
+def test_dump():
+
+    class Line(R):
+        sku = Field('sku')
+
+    class Map(R):
+        id = Field('id')
+        name = Field('name')
+        note = Field('note')
+        lines = Field('lines').as_(Line(many=True))
+
+    targets = [{'id': i, 'name': 'Nåme "%d"' % i, 'note': None, 'lines': [{'sku': 'x'}]} for i in range(3)]
+    sink = io.BytesIO()
+    assert Map.dump(targets, sink, many=True) == 3
+    assert json.loads(sink.getvalue().decode('utf-8')) == json.loads(json.dumps(Map.transform(targets, many=True)))
+
+    sink = io.BytesIO()
+    Map.dump(targets[0], sink, format='ndjson', blank=False)
+    assert sink.getvalue() == b'{"id":0,"name":"N\xc3\xa5me \\"0\\"","lines":[{"sku":"x"}]}\n'
+
+    sink = io.BytesIO()
+    Map.dump(targets, sink, format='csv', many=True, compress=True, blank='-')
+    lines = gzip.decompress(sink.getvalue()).decode('utf-8').splitlines()
+    assert lines[:2] == ['id,name,note,lines', '0,"Nåme ""0""",-,[{\'sku\': \'x\'}]']
+    assert not sink.closed
+
+    for blank in (True, False, None, '', 0, '-'):
+        sink = io.BytesIO()
+        Map.dump(targets, sink, many=True, blank=blank)
+        assert json.loads(sink.getvalue().decode('utf-8')) == json.loads(
+            json.dumps(Map.transform(targets, many=True, blank=blank)))
+
+    with pytest.raises(ValueError):
+        Map.dump(targets, sink, format='xml')
+
+
+def test_instrument():
+
+    class Line(R):
+        sku = Field('sku')
+
+    class Map(R):
+        id = Field('id')
+        ratio = Field('count').call(lambda count: 1 / count)
+        lines = Field('lines').as_(Line(many=True))
+
+    calls = []
+    targets = [{'id': 1, 'count': 2, 'lines': [{'sku': 'a'}, {'sku': 'b'}]},
+               {'id': 2, 'count': 4, 'lines': [{'sku': 'c'}]}]
+    expect = Map.transform(targets, many=True)
+    with instrument(lambda *args: calls.append(args)) as stats:
+        assert Map.transform(targets, many=True) == expect
+        with pytest.raises(ZeroDivisionError):
+            Map.transform({'id': 3, 'count': 0, 'lines': [{'sku': 'd'}]})
+    info = stats.stats()
+    assert list(info) == ['Line', 'Line.sku', 'Map', 'Map.id', 'Map.lines', 'Map.ratio']
+    assert info['Line'].calls == 3 and info['Map.id'].calls == 3
+    assert (info['Map'].errors, info['Map.ratio'].errors, info['Map.lines'].calls) == (1, 1, 2)
+    assert info['Map'].time >= info['Map.lines'].time >= info['Line'].time > 0
+    assert len(calls) == sum(field.calls for field in info.values())
+
+    collector = Instrument()
+    Map.transform(targets[0], instrument=collector)
+    assert collector.stats()['Map'].calls == 1
+    assert Map.transform(targets[0]) and collector.stats()['Map'].calls == 1
+
+
+def test_missing_values():
+
+    def broken(value):
+        raise TypeError('broken handler')
+
+    class Map(R):
+        city = Field('address.city', required=False)
+        zip = Field('address.zip', default='-').to(str)
+        first = Field('tags')[0].set_null()
+        total = (Field('price') * Field('qty')).set_default(0)
+        upper = Field('name', required=False).call(str.upper)
+
+    assert Map.transform({'address': None, 'tags': [], 'price': 2}) == {
+        'city': None, 'zip': '-', 'first': None, 'total': 0, 'upper': None}
+    assert Map.transform({'address': {'zip': 1}, 'tags': ['a'], 'price': 2, 'qty': 3, 'name': 'x'}) == {
+        'city': None, 'zip': '1', 'first': 'a', 'total': 6, 'upper': 'X'}
+
+    class Strict(R):
+        name = Field('name')
+
+    class Handled(R):
+        name = Field('name', required=False).call(broken)
+
+    for target in ({}, object()):
+        with pytest.raises(MissingValueError):
+            Strict.transform(target)
+    with pytest.raises(KeyError, match="'name' is missing for field 'name'"):
+        Strict.transform({})
+    with pytest.raises(AttributeError):
+        Strict.transform(object())
+    with pytest.raises(TypeError, match='broken handler'):
+        Handled.transform({'name': 'x'})
+    assert Handled.transform({}) == {'name': None}
+
+
+def test_missing_value_chains():
+
+    class Map(R):
+        length = Field('a', required=False).to_str().call(len)
+        mapped = Field('a', default=0).map({1: 'one'}, default='?').to_str().call(len)
+        total = (Field('a', required=False) + Field('b', required=False)).to_str()
+        known = Field('a', required=False).at([1, 2]).to_str()
+        has = Field('tags', required=False).contains(1).to_str()
+        scaled = (Field('a', required=False) * 2 + Field('b', required=False)).to_str().call(len)
+
+    assert Map.transform({}) == {
+        'length': None, 'mapped': 0, 'total': None, 'known': None, 'has': None, 'scaled': None}
+    assert Map.transform({'b': 1}) == {
+        'length': None, 'mapped': 0, 'total': None, 'known': None, 'has': None, 'scaled': None}
+    assert Map.transform({'a': 1, 'b': 2, 'tags': [1]}) == {
+        'length': 1, 'mapped': 3, 'total': '3', 'known': 'True', 'has': 'True', 'scaled': 1}
+
+
+def test_lazy():
+    calls = []
+
+    class Line(R):
+        sku = Field('sku')
+
+    class Map(R):
+        id = Field('id')
+        note = Field('note')
+        lines = Field('lines').as_(Line(many=True))
+        price = MethodField()
+
+        def get_price(self, obj):
+            calls.append(obj['id'])
+            return obj['id'] * 10
+
+    targets = [{'id': i, 'note': None, 'lines': [{'sku': 'a'}]} for i in range(3)]
+    records = Map.transform(targets, many=True, lazy=True)
+    assert [record['id'] for record in records] == [0, 1, 2]
+    assert records[1]['price'] == 10 and records[1]['price'] == 10
+    assert calls == [1]
+    assert dict(records[2]) == {'id': 2, 'note': None, 'lines': [{'sku': 'a'}], 'price': 20}
+    assert records[0] == Map.transform(targets[0])
+    assert calls == [1, 2, 0, 0]
+
+    record = Map.transform(targets[0], lazy=True, blank=False)
+    assert list(record) == ['id', 'lines', 'price'] and len(record) == 3 and 'note' not in record
+    with pytest.raises(KeyError):
+        record['note']
+    with pytest.raises(TypeError):
+        record['id'] = 1
+
+
+def test_projection():
+    calls = []
+
+    class Line(R):
+        sku = Field('sku')
+        qty = Field('qty')
+
+    class Map(R):
+        id = Field('id')
+        name = Field('name').call(lambda name: calls.append(name) or name)
+        lines = Field('lines').as_(Line(many=True))
+        point = Field('point').as_({'x': Field('lat'), 'y': Field('lon')})
+        price = MethodField()
+
+        def get_price(self, obj):
+            calls.append('price')
+            return 1
+
+    target = {'id': 1, 'name': 'a', 'lines': [{'sku': 's', 'qty': 2}], 'point': {'lat': 3, 'lon': 4}}
+    assert Map.transform(target, only=['id', 'lines.sku', 'point.y']) == {
+        'id': 1, 'lines': [{'sku': 's'}], 'point': {'y': 4}}
+    assert calls == []
+    assert Map.transform(target, exclude=['name', 'lines.qty', 'point']) == {
+        'id': 1, 'lines': [{'sku': 's'}], 'price': 1}
+    assert calls == ['price']
+    assert Map.transform(target, only=['lines'], exclude=['lines.sku']) == {'lines': [{'qty': 2}]}
+    assert Map.transform(target) == {'id': 1, 'name': 'a', 'lines': [{'sku': 's', 'qty': 2}],
+                                     'point': {'x': 3, 'y': 4}, 'price': 1}
+    assert Map._project(['id']) is Map._project(('id',)) and Map.__fields__ == Map._project().__fields__
+    assert Map.transform(target, only=['id'], output=tuple) == (1,)
+    with pytest.raises(ValueError):
+        Map.transform(target, only=['missing'])
+    with pytest.raises(ValueError):
+        Map.transform(target, only=['id.a'])
+
+
+def test_projection_iter():
+    calls = []
+
+    def count(value):
+        calls.append(value)
+        return value
+
+    class Line(R):
+        sku = Field('sku')
+        qty = Field('qty').call(count)
+
+    class Map(R):
+        lines = Field('lines').iter([Field('self').as_(Line())])
+        rows = Field('lines').iter([{'sku': Field('sku'), 'qty': Field('qty').call(count)}])
+
+    target = {'lines': [{'sku': 's', 'qty': 2}, {'sku': 't', 'qty': 3}]}
+    assert Map.transform(target, only=['lines.sku', 'rows.sku']) == {
+        'lines': [{'sku': 's'}, {'sku': 't'}], 'rows': [{'sku': 's'}, {'sku': 't'}]}
+    assert calls == []
+    assert Map.transform(target, exclude=['lines.sku', 'rows.qty']) == {
+        'lines': [{'qty': 2}, {'qty': 3}], 'rows': [{'sku': 's'}, {'sku': 't'}]}
+    assert calls == [2, 3]
+    with pytest.raises(ValueError):
+        Map.transform(target, only=['lines.price'])
+
+
+def test_retransform():
+    calls = []
+
+    class Line(R):
+        sku = Field('sku')
+
+    class Map(R):
+        id = Field('id')
+        city = Field('address').city
+        label = Field('name') + ' ' + Field('address.zip')
+        lines = Field('lines').as_(Line(many=True))
+        point = Field('point').as_({'x': Field('lat'), 'y': Field('lon')})
+        slug = Field('name').call(lambda name: calls.append(name) or name.lower(), cache=True)
+        stamp = Field('id').call(lambda id: calls.append(id) or id)
+
+    target = {'id': 1, 'name': 'A', 'address': {'city': 'Oslo', 'zip': '01'},
+              'lines': [{'sku': 's'}], 'point': {'lat': 1, 'lon': 2}}
+    previous = Map.transform(target)
+    del calls[:]
+    target = dict(target, address={'city': 'Bergen', 'zip': '02'}, point={'lat': 5, 'lon': 2})
+    result = Map.retransform(target, previous, changed=['address', 'point.lat'])
+    assert result == Map.transform(target)
+    assert result['lines'] is previous['lines']
+    assert calls == [1, 1]
+
+    previous = Map.transform([target], many=True, output=tuple)
+    target = dict(target, lines=[{'sku': 'x'}])
+    assert Map.retransform([target], previous, changed=['lines.0.sku'], many=True, output=tuple) == \
+        Map.transform([target], many=True, output=tuple)
+
+
+def test_retransform_methods():
+
+    class Map(R):
+        x = Field('a').get('x')
+        n = Field('a').keys().call(sorted, cache=True)
+
+    previous = Map.transform({'a': {'x': 1, 'y': 2}})
+    target = {'a': {'x': 5, 'y': 2, 'z': 3}}
+    assert Map.retransform(target, previous, changed=['a.x', 'a.z']) == {'x': 5, 'n': ['x', 'y', 'z']}
+    assert Map._dependency_map() == {'x': {('a',)}, 'n': {('a',)}}
+
+
+def test_specialized_steps():
+
+    class Map(R):
+        admin = Field('role').at(['admin', 'root'])
+        listed = Field('tags').at([['a'], 'b'])
+        status = Field('status').map(['new', 'active'], default='?')
+        meta = Field('id').as_({'kind': 'user', 'flags': {'a': 1}, 'id': Field('self')})
+
+    result = Map.transform({'role': ['admin'], 'tags': ['a'], 'status': 5, 'id': 1})
+    assert result == {'admin': False, 'listed': True, 'status': '?',
+                      'meta': {'kind': 'user', 'flags': {'a': 1}, 'id': 1}}
+    assert Map.transform({'role': 'root', 'tags': 'b', 'status': 1, 'id': 2})['admin'] is True
+    other = Map.transform({'role': 'x', 'tags': 'c', 'status': 0, 'id': 3})
+    assert other['meta']['flags'] is not result['meta']['flags']
+
+
+@pytest.mark.parametrize('output', [OrderedDict, tuple])
+def test_nested_schemas_inline(output):
+
+    class Attribute(R):
+        name = Field('name')
+        parent = MethodField()
+
+        def get_parent(self, obj):
+            return self.content['parent']['sku']
+
+    class Line(R):
+        sku = Field('sku')
+        note = Field('note')
+        attributes = Field('attributes').as_(Attribute(many=True))
+
+    class Order(R):
+        id = Field('id')
+        lines = Field('lines').as_(Line(many=True, blank='-'))
+        first = Field('first').as_(Line(blank=False))
+
+    line = {'sku': 's', 'note': None, 'attributes': [{'name': 'a'}]}
+    result = Order.transform({'id': 1, 'lines': [line, line], 'first': line}, output=output)
+    if output is tuple:
+        assert result == (1, [('s', '-', [('a', 's')])] * 2, ('s', None, [('a', 's')]))
+    else:
+        attributes = [{'name': 'a', 'parent': 's'}]
+        assert result == {'id': 1, 'lines': [{'sku': 's', 'note': '-', 'attributes': attributes}] * 2,
+                          'first': {'sku': 's', 'attributes': attributes}}
+
+
+def test_iter_dict_entries():
+
+    class Map(R):
+        upper = Field('attrs').iter({Field('key').upper(): Field('value') * 2}, condition=Field('value') > 1)
+        pairs = Field('attrs').iter([Field('self')])
+        values = Field('attrs').iter((Field('value.x', required=False),))
+        listed = Field('rows').iter([Field('value')])
+
+    result = Map.transform({'attrs': {'a': 1, 'b': 2}, 'rows': [{'value': 1}]})
+    assert result['upper'] == {'B': 4}
+    assert result['pairs'] == [{'key': 'a', 'value': 1}, {'key': 'b', 'value': 2}]
+    assert result['listed'] == [1]
+    assert Map.transform({'attrs': {'a': {'x': 1}}, 'rows': []}, only=['values'])['values'] == [1]
+
+
+def test_iter_window():
+    import asyncio
+    checked = []
+
+    def small(value):
+        checked.append(value)
+        return value < 5
+
+    class Map(R):
+        first = Field('rows').iter([Field('n')], condition=Field('n').call(small), limit=2, offset=1)
+        top = Field('rows').iter([Field('n')], order_by=Field('score'), reverse=True, limit=2)
+        ordered = Field('rows').iter([Field('n')], order_by=Field('score'))
+        last = Field('rows').iter([Field('n')], reverse=True, limit=1)
+        lowest = Field('scores').iter({Field('key'): Field('value')}, order_by=Field('value'), limit=1)
+
+    rows = [{'n': n, 'score': n * 7 % 10} for n in range(10)]
+    result = Map.transform({'rows': rows, 'scores': {'a': 2, 'b': 1}})
+    assert result['first'] == [1, 2]
+    assert checked == [0, 1, 2]
+    assert result['top'] == [7, 4]
+    assert result['ordered'] == [0, 3, 6, 9, 2, 5, 8, 1, 4, 7]
+    assert result['last'] == [9]
+    assert result['lowest'] == {'b': 1}
+    assert asyncio.run(Map.atransform({'rows': rows, 'scores': {'a': 2, 'b': 1}})) == result
+
+
+def test_pickle():
+    target = {'name': 'ann lee', 'price': '7', 'status': 1, 'tags': ['a', 'b'], 'lines': [
+        {'sku': 'x', 'price': 3, 'count': 2},
+        {'sku': 'y', 'price': 1, 'count': 5},
+        {'sku': 'z', 'price': 2, 'count': 1},
+    ]}
+    fields = OrderedDict((name, pickle.loads(pickle.dumps(getattr(Pickled, name)))) for name in Pickled.__fields__)
+    Copy = type('Copy', (Pickled,), fields)
+    expect = Pickled.transform(target)
+    assert expect['skus'] == ['y', 'x'] and expect['price'] == 15 and expect['city'] is None
+    assert Copy.transform(target) == expect
+    assert [op[0] for op in Copy.price._ops] == ['to', 'rmul', 'add']
+    assert Copy.price._ops[0][1] is not Pickled.price._ops[0][1]
+
+    projected = pickle.loads(pickle.dumps(Pickled(only=['name', 'lines.sku'])))
+    assert projected._transform(target) == {'name': 'ANN LEE', 'lines': [{'sku': 'x'}, {'sku': 'y'}, {'sku': 'z'}]}
+    assert type(projected) is Pickled._project(['name', 'lines.sku'])
+
+
+def test_warmup(engine, tmp_path, monkeypatch):
+    import reformer
+
+    class Child(R):
+        sku = Field('sku').upper()
+
+    class Map(R):
+        name = Field('name').upper()
+        lines = Field('lines').iter([Field('self').as_(Child())])
+
+    assert '_getter' not in Map.name.__dict__
+    reformer.warmup([Map, Map(output=dict)])
+    assert '_getter' in Map.name.__dict__ and '_getter' in Child.sku.__dict__
+    assert set(Map.__dict__.get('__compiled__', ())) == ({'ordered', 'dict'} if engine else set())
+
+    # compiled transforms are kept in the cache directory for later processes
+    monkeypatch.setattr(R, '_cache_dir_', str(tmp_path))
+    Map._compiled(reformer._output('namedtuple'))
+    assert len(list(tmp_path.iterdir())) == 1
+    del Map.__compiled__
+    monkeypatch.setattr(reformer, 'compile', None, raising=False)
+    result = Map._compiled(reformer._output('namedtuple'))(Map(output='namedtuple'), {'name': 'a', 'lines': []})
+    assert result == ('A', [])
+
+
+def test_transform_json(tmp_path):
+    import reformer
+
+    class Map(R):
+        id = Field('id')
+        city = Field('address.city')
+        name = Field('name').upper()
+        tags = Field('tags').iter([Field('self')])
+
+    records = [{'id': i, 'name': 'a "b" é', 'address': {'city': 'Oslo', 'zip': [1, {'x': '}]'}]},
+                'tags': ['t'], 'blob': {'deep': [[{'s': 'x\\"]'}]], 'n': -1.5e3, 'ok': True}} for i in range(3)]
+    data = json.dumps(records, indent=1)
+    path = tmp_path / 'records.json'
+    path.write_bytes(data.encode())
+    expect = Map.transform(records, many=True)
+    assert Map.transform_json(data, many=True) == expect
+    assert Map.transform_json(data.encode(), many=True) == expect
+    with open(str(path), 'rb') as file:
+        assert Map.transform_json(file, many=True) == expect
+    assert Map.transform_json(io.StringIO(json.dumps(records[0]))) == expect[0]
+
+    tree = reformer._json_tree(Map._dependency_map())
+    assert reformer._JsonReader(json.dumps(records[0]).encode()).document(tree) == {
+        'id': 0, 'name': 'a "b" é', 'address': {'city': 'Oslo'}, 'tags': ['t']}
+
+    class Methods(R):
+        x = Field('a').get('x')
+        n = Field('a').keys().call(list, cache=True)
+
+    assert Methods.transform_json('{"a": {"x": 1, "y": 2}, "b": [3]}') == {'x': 1, 'n': ['x', 'y']}
+
+    class Everything(R):
+        keys = MethodField()
+
+        def get_keys(self, obj):
+            return sorted(obj)
+
+    assert Everything.transform_json(data, many=True)[0]['keys'] == ['address', 'blob', 'id', 'name', 'tags']
+
+    class Id(R):
+        id = Field('id')
+
+    for invalid in ('[{"id": 1,}]', '[{"id" 1}]', '[{"id": 1}] 2', '{"id": [1, 2}'):
+        with pytest.raises(ValueError):
+            Id.transform_json(invalid, many=invalid.startswith('['))
+
+
+@pytest.mark.parametrize('options', [['--workers', '1'], ['--workers', '2'], ['--workers', '2', '--unordered']])
+def test_main(tmp_path, capsys, options):
+    import reformer
+
+    source, sink = tmp_path / 'in.ndjson', tmp_path / 'out.ndjson'
+    targets = [{'name': 'name %d' % i, 'value': i} for i in range(50)]
+    source.write_text(''.join(json.dumps(target) + '\n' for target in targets) + '\n')
+    assert reformer.main(['tests:Parallel', str(source), str(sink), '--chunk-size', '64'] + options) == 0
+    lines = [json.loads(line) for line in sink.read_text().splitlines()]
+    expect = [dict(record) for record in Parallel.transform(targets, many=True)]
+    assert (lines if '--unordered' not in options else sorted(lines, key=lambda line: line['double'])) == expect
+    assert capsys.readouterr().err.startswith('50 records, ')